@@ -0,0 +1,138 @@
+"""
+This module renders charts of the dataset to image files from the command line, without
+a display, e.g.
+
+    python batch_render.py nightly.json --output-dir reports --processes 4
+
+The specs file holds a list of charts, each one described by an object such as
+
+    {"type": "bar", "x": "BORO", "group_by": "VIC_SEX", "theme": "ggplot",
+     "output": "boro_by_sex.png"}
+
+with the keys
+    type: bar | scatter | line | density | choropleth
+    x, y: the columns on the x and y axis, a bar chart takes either of them and is
+        horizontal when given y, a choropleth maps the regions of x (PRECINCT | BORO)
+    group_by: the column grouping the incidents
+    granularity: day | month | year, the calendar feature of the date column on the
+        axes and the group by (year by default)
+    theme: the matplotlib style of the chart (bmh by default)
+    output: the path of the image, relative to the output directory, its extension
+        (png or svg) choosing the format
+    width, height, dpi: the size of the image, in inches and dots per inch
+and the chart options of the window: stacked (bar), alpha, shade, rasterise (scatter),
+aggregation (line) and metric (choropleth).
+
+The charts are prepared and drawn by the plotting core of the window, see plot_engine,
+with the Agg backend, across a pool of processes which share the memory-mapped snapshot
+of the dataset.
+
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+# nothing is displayed, matplotlib must not look for a display
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import matplotlib as mpl
+
+from cube import CountCube
+from plot_engine import MURDER_COLUMN, PlotSpec, prepare_plot, render_plot
+from utilities import CATEGORICAL_COLUMNS, DATASET_PATH, OffscreenCanvas, _build_calendar_features, _load_dataset_from_memory
+
+IMAGE_FORMATS = [".png", ".svg"]
+# the first theme listed by the window
+DEFAULT_THEME = "bmh"
+# the keys of a spec describing the image rather than the chart
+IMAGE_KEYS = ["theme", "output", "width", "height", "dpi"]
+
+# the dataset of the worker process, loaded once by _load_worker_dataset
+_data = None
+_calendar = None
+_cube = None
+
+
+def _load_worker_dataset(path: str, memory_map: bool) -> None:
+    """Load the dataset and its calendar features in a worker process"""
+    global _data, _calendar, _cube
+    _data = _load_dataset_from_memory(path, memory_map=memory_map)
+    _calendar = _build_calendar_features(_data.index)
+    # the bar charts and choropleths rendered by the worker share the counts of the cube
+    _cube = CountCube(_data, _calendar, [*CATEGORICAL_COLUMNS, MURDER_COLUMN])
+
+
+def render_spec(spec: dict, output_dir: str = ".") -> str:
+    """Render the chart described by spec to its image file and return the path of the
+    file, the dataset must have been loaded by _load_worker_dataset"""
+    output = os.path.join(output_dir, spec["output"])
+    extension = os.path.splitext(output)[1].lower()
+    if extension not in IMAGE_FORMATS:
+        raise ValueError(f"unsupported image format {extension!r}, expected one of "
+                         f"{', '.join(IMAGE_FORMATS)}")
+
+    plot_spec = PlotSpec.from_dict({key: value for key, value in spec.items()
+                                    if key not in IMAGE_KEYS and value not in (None, "None")})
+    prepared = prepare_plot(plot_spec, _data, _calendar, _cube)
+
+    # the axes take their colours from the theme when they are created
+    with mpl.style.context(spec.get("theme", DEFAULT_THEME)):
+        canvas = OffscreenCanvas()
+        canvas.figure.set_size_inches(spec.get("width", 8), spec.get("height", 6))
+        render_plot(plot_spec, prepared, canvas)
+
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        canvas.figure.savefig(output, dpi=spec.get("dpi", 100))
+    return output
+
+
+def _render_job(job) -> (dict, str, str):
+    """Render a spec in a worker process, returning the spec with its output path or
+    the error which prevented it"""
+    spec, output_dir = job
+    try:
+        return spec, render_spec(spec, output_dir), None
+    except Exception as error:
+        # a spec failing must not stop the batch, an exception raised in the pool would
+        # end imap_unordered and leave the remaining specs unrendered
+        return spec, None, f"{type(error).__name__}: {error}"
+
+
+def render_specs(specs: list, output_dir: str = ".", path: str = DATASET_PATH,
+                 processes: int = None) -> int:
+    """Render the specs across a pool of processes and return the number of failures"""
+    # write the snapshot of the dataset once, the workers then map it in memory
+    _load_dataset_from_memory(path)
+
+    failures = 0
+    with multiprocessing.Pool(processes, initializer=_load_worker_dataset,
+                              initargs=(path, True)) as pool:
+        jobs = [(spec, output_dir) for spec in specs]
+        for spec, output, error in pool.imap_unordered(_render_job, jobs):
+            if error is None:
+                print(f"rendered {output}")
+            else:
+                failures += 1
+                print(f"failed {spec.get('output', spec)}: {error}", file=sys.stderr)
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render charts of the NYPD shooting dataset "
+                                                 "to image files")
+    parser.add_argument("specs", help="the JSON file holding the list of charts to render")
+    parser.add_argument("--output-dir", default=".", help="the directory of the images")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="the path of the dataset")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="the number of rendering processes, one per CPU by default")
+    arguments = parser.parse_args()
+
+    with open(arguments.specs) as specs_file:
+        specs = json.load(specs_file)
+    if not isinstance(specs, list):
+        parser.error("the specs file must hold a list of charts")
+
+    sys.exit(1 if render_specs(specs, arguments.output_dir, arguments.dataset, arguments.processes) else 0)
@@ -0,0 +1,231 @@
+"""
+This module contains the benchmark suite measuring the load of the dataset and every
+chart of the program, to catch performance regressions between commits.
+
+The suite runs without a display on synthetic datasets following the schema of
+NYPD_Shooting.csv, generated once at each size in benchmark_data. It times each step and
+measures its peak memory, then saves the results in benchmark_results under the current
+commit, e.g.
+
+    python benchmark_suite.py --sizes 25k 250k
+    python benchmark_suite.py --sizes 25k --compare benchmark_results/1d258c2.json
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+# nothing is displayed, matplotlib must not look for a display
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import matplotlib as mpl
+import numpy as np
+import pandas as pd
+
+from benchmarks import _best_time
+from plot_engine import PlotSpec, prepare_plot, render_plot
+from utilities import OffscreenCanvas, _build_calendar_features, _load_dataset_from_memory
+
+DATA_DIRECTORY = "benchmark_data"
+RESULTS_DIRECTORY = "benchmark_results"
+SIZES = {"25k": 25_000, "250k": 250_000, "2.5M": 2_500_000}
+# the rows generated at a time, so that the largest dataset fits in memory
+GENERATION_CHUNK = 250_000
+# the fraction of incidents without a time or a location, as in the published dataset
+MISSING_FRACTION = .01
+
+BOROUGHS = ["BRONX", "BROOKLYN", "MANHATTAN", "QUEENS", "STATEN ISLAND"]
+LOCATIONS = ["", "MULTI DWELL - PUBLIC HOUS", "MULTI DWELL - APT BUILD", "PVT HOUSE",
+             "GROCERY/BODEGA", "BAR/NIGHT CLUB", "COMMERCIAL BLDG", "NONE"]
+AGE_GROUPS = ["<18", "18-24", "25-44", "45-64", "65+", "UNKNOWN"]
+# the perpetrator age groups include the miscoded ages of the original dataset
+PERP_AGE_GROUPS = AGE_GROUPS + ["224", "940", "1020", ""]
+SEXES = ["M", "F", "U"]
+RACES = ["BLACK", "WHITE HISPANIC", "BLACK HISPANIC", "WHITE", "ASIAN / PACIFIC ISLANDER",
+         "AMERICAN INDIAN/ALASKAN NATIVE", "UNKNOWN"]
+
+# every chart of the window, with and without grouping
+CHARTS = {
+    "bar vertical": PlotSpec("bar", x="LOCATION_DESC"),
+    "bar vertical by group": PlotSpec("bar", x="LOCATION_DESC", group_by="PERP_RACE"),
+    "bar horizontal": PlotSpec("bar", y="OCCUR_DATE_OCCUR_TIME", y_granularity="month"),
+    "bar horizontal by group": PlotSpec("bar", y="OCCUR_DATE_OCCUR_TIME", y_granularity="month",
+                                        group_by="BORO"),
+    "scatter": PlotSpec("scatter", x="Longitude", y="Latitude"),
+    "scatter by group": PlotSpec("scatter", x="Longitude", y="Latitude", group_by="BORO"),
+    "scatter rasterised by group": PlotSpec("scatter", x="Longitude", y="Latitude",
+                                            group_by="BORO", rasterise=True),
+    "line": PlotSpec("line", x="Longitude", y="Latitude"),
+    "line by month": PlotSpec("line", x="OCCUR_DATE_OCCUR_TIME", y="Latitude",
+                              x_granularity="month", aggregation="Mean"),
+    "density": PlotSpec("density", x="Longitude", y="Latitude"),
+    "density by group": PlotSpec("density", x="Longitude", y="Latitude", group_by="BORO"),
+}
+
+
+def _generate_dataset(rows: int, path: str, seed=0) -> None:
+    """Write a synthetic dataset of rows incidents with the columns of NYPD_Shooting.csv"""
+    rng = np.random.default_rng(seed)
+    # the dates and times are formatted once for each distinct value
+    days = pd.date_range("2006-01-01", "2020-12-31", freq="D").strftime("%m/%d/%Y").to_numpy()
+    minutes = pd.date_range("00:00", periods=24 * 60, freq="min").strftime("%H:%M:%S").to_numpy()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for start in range(0, rows, GENERATION_CHUNK):
+        size = min(GENERATION_CHUNK, rows - start)
+        latitude = rng.normal(40.73, 0.08, size)
+        longitude = rng.normal(-73.92, 0.08, size)
+        unlocated = rng.random(size) < MISSING_FRACTION
+        latitude[unlocated] = longitude[unlocated] = np.nan
+        times = rng.choice(minutes, size).astype(object)
+        times[rng.random(size) < MISSING_FRACTION] = ""
+        chunk = pd.DataFrame({
+            "INCIDENT_KEY": rng.integers(10 ** 7, 3 * 10 ** 8, size),
+            "OCCUR_DATE": rng.choice(days, size),
+            "OCCUR_TIME": times,
+            "BORO": rng.choice(BOROUGHS, size),
+            "PRECINCT": rng.integers(1, 124, size),
+            "JURISDICTION_CODE": rng.choice(["0", "1", "2", ""], size, p=[.8, .05, .149, .001]),
+            "LOCATION_DESC": rng.choice(LOCATIONS, size),
+            "STATISTICAL_MURDER_FLAG": rng.choice(["true", "false"], size, p=[.2, .8]),
+            "PERP_AGE_GROUP": rng.choice(PERP_AGE_GROUPS, size),
+            "PERP_SEX": rng.choice(SEXES + [""], size),
+            "PERP_RACE": rng.choice(RACES + [""], size),
+            "VIC_AGE_GROUP": rng.choice(AGE_GROUPS, size),
+            "VIC_SEX": rng.choice(SEXES, size),
+            "VIC_RACE": rng.choice(RACES, size),
+            "X_COORD_CD": rng.integers(900_000, 1_100_000, size),
+            "Y_COORD_CD": rng.integers(100_000, 300_000, size),
+            "Latitude": latitude,
+            "Longitude": longitude,
+            "Lon_Lat": ["" if np.isnan(x) else f"POINT ({x} {y})" for x, y in zip(longitude, latitude)],
+        })
+        chunk.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def _dataset_path(size: str) -> str:
+    """Return the path of the synthetic dataset of a size, generating it the first time"""
+    path = os.path.join(DATA_DIRECTORY, size, "NYPD_Shooting.csv")
+    if not os.path.exists(path):
+        print(f"generating {SIZES[size]} incidents in {path}")
+        _generate_dataset(SIZES[size], path)
+    return path
+
+
+def _peak_memory(function) -> float:
+    """Return the peak memory in MB allocated during a call of a function"""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def _chart(spec: PlotSpec, data: pd.DataFrame, calendar: pd.DataFrame):
+    """Return a function preparing and rendering the chart of spec on a new canvas"""
+    def chart():
+        with mpl.style.context("bmh"):
+            canvas = OffscreenCanvas()
+            render_plot(spec, prepare_plot(spec, data, calendar), canvas)
+            canvas.draw()
+    return chart
+
+
+def run_suite(sizes) -> list:
+    """Time every step of the suite at each size and return the results"""
+    results = []
+
+    def measure(name, size, function, repeat):
+        seconds = _best_time(function, repeat)
+        peak = _peak_memory(function)
+        results.append({"benchmark": name, "size": size, "seconds": seconds, "peak_mb": peak})
+        print(f"    {name:<40} {seconds * 1000:>10.1f} ms {peak:>10.1f} MB")
+
+    for size in sizes:
+        path = _dataset_path(size)
+        # a single run of the steps which take seconds on the largest dataset
+        repeat = 3 if SIZES[size] <= 250_000 else 1
+        print(f"{size} incidents")
+
+        measure("load csv", size, lambda: _load_dataset_from_memory(path, use_snapshot=False), repeat)
+        _load_dataset_from_memory(path)
+        measure("load snapshot", size, lambda: _load_dataset_from_memory(path), repeat)
+
+        data = _load_dataset_from_memory(path)
+        calendar = _build_calendar_features(data.index)
+        for name, spec in CHARTS.items():
+            measure(name, size, _chart(spec, data, calendar), repeat)
+    return results
+
+
+def _commit() -> str:
+    """Return the short hash of the current commit, marked if the tree has changes"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True, cwd=directory).stdout.strip()
+        changes = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                 capture_output=True, text=True, check=True, cwd=directory).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if changes else commit
+
+
+def save_results(results: list) -> str:
+    """Save the results under the current commit and return the path of the file"""
+    commit = _commit()
+    os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+    path = os.path.join(RESULTS_DIRECTORY, f"{commit}.json")
+    report = {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "matplotlib": mpl.__version__,
+        "results": results,
+    }
+    with open(path, "w") as results_file:
+        json.dump(report, results_file, indent=2)
+    return path
+
+
+def compare_results(results: list, path: str) -> None:
+    """Print the change of every result from those saved in path"""
+    with open(path) as results_file:
+        reference = json.load(results_file)
+    previous = {(result["benchmark"], result["size"]): result for result in reference["results"]}
+
+    print(f"Compared with {reference['commit']}")
+    for result in results:
+        before = previous.get((result["benchmark"], result["size"]))
+        if before is None:
+            continue
+        print(f"    {result['size']:>5} {result['benchmark']:<40} "
+              f"{result['seconds'] / before['seconds']:>8.2f}x time "
+              f"{result['peak_mb'] / max(before['peak_mb'], 1e-9):>8.2f}x memory")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the benchmark suite of the NYPD shooting program")
+    parser.add_argument("--sizes", nargs="*", metavar="size", default=list(SIZES),
+                        help=f"the dataset sizes ({', '.join(SIZES)}), all of them by default")
+    parser.add_argument("--compare", metavar="results",
+                        help="a results file of a previous run to compare with")
+    arguments = parser.parse_args()
+
+    unknown = set(arguments.sizes) - set(SIZES)
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(sorted(unknown))}")
+
+    suite_results = run_suite(arguments.sizes)
+    # compare before saving, the previous results may be those of the same commit
+    if arguments.compare:
+        compare_results(suite_results, arguments.compare)
+    print(f"results saved in {save_results(suite_results)}")
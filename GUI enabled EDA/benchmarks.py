@@ -0,0 +1,325 @@
+"""
+This module contains the benchmarks of the time consuming parts of the program.
+
+Each benchmark times the current implementation against the implementation it replaced,
+run it from the GUI enabled EDA folder so that the dataset is found, e.g.
+
+    python benchmarks.py load
+
+"""
+
+import argparse
+import itertools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from seaborn._statistics import KDE
+
+# the benchmarks do not display anything
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtChart import QChart, QLineSeries
+
+from bitmap_index import BitmapIndex
+from choropleth import load_region_geometry
+from cube import CountCube
+from kde import binned_kde
+from plot_engine import MURDER_COLUMN, PlotSpec, prepare_plot
+from spatial_index import SpatialIndex
+from utilities import (CATEGORICAL_COLUMNS, DATASET_PATH, CreateCanvas, _build_calendar_features,
+                       _build_point_buffer, _count_crosstab, _date_slice,
+                       _load_dataset_from_memory, _parse_dataset)
+
+
+def _best_time(function, repeat=5) -> float:
+    """Return the best wall time in seconds of several calls of a function"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _report(title, timings: dict) -> None:
+    """Print the timings of a benchmark relative to the first, reference, timing"""
+    print(title)
+    reference = next(iter(timings.values()))
+    for name, timing in timings.items():
+        print(f"    {name:<40} {timing * 1000:>10.1f} ms {reference / timing:>8.1f}x")
+
+
+def _legacy_parse_dataset(path: str) -> pd.DataFrame:
+    """The loader before the declared schema: inferred types and combined dates parsed
+    row by row"""
+    data = pd.read_csv(path)
+    data.insert(0, "OCCUR_DATE_OCCUR_TIME", pd.to_datetime(data["OCCUR_DATE"] + " " + data["OCCUR_TIME"]))
+    data = data.drop(["OCCUR_DATE", "OCCUR_TIME", "Lon_Lat", "X_COORD_CD", "Y_COORD_CD", "INCIDENT_KEY"],
+                     axis=1)
+
+    categorical_columns = [
+        'BORO', 'PRECINCT', 'JURISDICTION_CODE', 'LOCATION_DESC', 'PERP_AGE_GROUP',
+        'PERP_SEX', 'PERP_RACE', 'VIC_AGE_GROUP', 'VIC_SEX', 'VIC_RACE'
+    ]
+    data[categorical_columns] = data[categorical_columns].astype('category')
+    return data.set_index("OCCUR_DATE_OCCUR_TIME", drop=False)
+
+
+def benchmark_load(path=DATASET_PATH, repeat=5) -> None:
+    """Time the parsing of the shooting CSV file"""
+    timings = {
+        "inferred types, row by row dates": _best_time(lambda: _legacy_parse_dataset(path), repeat),
+        "declared schema, vectorised dates": _best_time(lambda: _parse_dataset(path), repeat),
+    }
+    _report(f"Parsing {path}", timings)
+
+
+def benchmark_line_series(path=DATASET_PATH, repeat=3) -> None:
+    """Time the filling of the line chart series with every incident"""
+    app = QApplication.instance() or QApplication([])
+    data = _load_dataset_from_memory(path)
+    xaxis, yaxis = data.index.year, data["Latitude"]
+
+    def fill(bulk):
+        chart = QChart()
+        line_series = QLineSeries()
+        chart.addSeries(line_series)
+        if bulk:
+            line_series.replace(_build_point_buffer(xaxis, yaxis))
+        else:
+            for x, y in zip(xaxis, yaxis):
+                line_series.append(x, y)
+        app.processEvents()
+
+    timings = {
+        "append point by point": _best_time(lambda: fill(bulk=False), repeat),
+        "replace with a point buffer": _best_time(lambda: fill(bulk=True), repeat),
+    }
+    _report(f"Filling a QLineSeries with {len(data)} points", timings)
+
+
+def benchmark_kde(path=DATASET_PATH, repeat=3) -> None:
+    """Time the density charts drawn by seaborn and by the binned kde, and compare their
+    density estimates"""
+    app = QApplication.instance() or QApplication([])
+    canvas = CreateCanvas()
+    data = _load_dataset_from_memory(path)
+    longitude = data["Longitude"].to_numpy(np.float64)
+    latitude = data["Latitude"].to_numpy(np.float64)
+    groups = data["BORO"]
+
+    def chart(seaborn, xaxis, yaxis=None, hue=None):
+        canvas.clear()
+        if seaborn:
+            sns.kdeplot(x=xaxis, y=yaxis, hue=hue, fill=True, ax=canvas.axes)
+        else:
+            canvas.plot_density(xaxis, yaxis, hue)
+        canvas.draw()
+
+    charts = {
+        f"Density of {len(data)} longitudes": (longitude,),
+        f"Density of {len(data)} longitudes by BORO": (longitude, None, groups),
+        f"Density of {len(data)} locations": (longitude, latitude),
+        f"Density of {len(data)} locations by BORO": (longitude, latitude, groups),
+    }
+    for title, arguments in charts.items():
+        # seaborn takes seconds for the locations
+        timings = {
+            "seaborn kdeplot": _best_time(lambda: chart(True, *arguments), 1),
+            "binned fft kde": _best_time(lambda: chart(False, *arguments), repeat),
+        }
+        _report(title, timings)
+
+    # the largest difference relative to the density's peak, on seaborn's grid
+    reference, support = KDE()(longitude)
+    (grid,), density = binned_kde(longitude)
+    error = np.abs(np.interp(support, grid, density) - reference).max() / reference.max()
+    print(f"    largest difference with seaborn, 1D: {error:.2%} of the peak")
+
+    sample = slice(None, None, max(len(data) // 5000, 1))
+    reference, _ = KDE()(longitude[sample], latitude[sample])
+    _, density = binned_kde([longitude[sample], latitude[sample]])
+    error = np.abs(density.T - reference).max() / reference.max()
+    print(f"    largest difference with seaborn, 2D: {error:.2%} of the peak")
+
+
+def benchmark_grouped_bar(path=DATASET_PATH, repeat=5) -> None:
+    """Time the grouped bar chart of the locations by the perpetrators' race"""
+    app = QApplication.instance() or QApplication([])
+    canvas = CreateCanvas()
+    data = _load_dataset_from_memory(path)
+    values, groups = data["LOCATION_DESC"], data["PERP_RACE"]
+
+    def crosstab():
+        return pd.crosstab(pd.Series(values.array, name=values.name),
+                           pd.Series(groups.array, name=groups.name), dropna=False)
+
+    timings = {
+        "pd.crosstab": _best_time(crosstab, repeat),
+        "np.bincount on category codes": _best_time(lambda: _count_crosstab(values, groups), repeat),
+    }
+    _report(f"Counting {len(data)} incidents by LOCATION_DESC and PERP_RACE", timings)
+
+    def chart(seaborn, stacked=False):
+        canvas.clear()
+        if seaborn:
+            sns.countplot(x="LOCATION_DESC", hue="PERP_RACE", data=data, ax=canvas.axes)
+        else:
+            canvas.plot_grouped_bar_chart("Vertical", _count_crosstab(values, groups),
+                                          axis_label="LOCATION_DESC", stacked=stacked)
+        canvas.draw()
+
+    timings = {
+        "seaborn countplot": _best_time(lambda: chart(True), repeat),
+        "grouped bars from the crosstab": _best_time(lambda: chart(False), repeat),
+        "stacked bars from the crosstab": _best_time(lambda: chart(False, stacked=True), repeat),
+    }
+    _report("Drawing the grouped bar chart", timings)
+
+
+def benchmark_count_cube(path=DATASET_PATH, repeat=5) -> None:
+    """Time the counts of the bar charts read from the cube against a scan of the dataset"""
+    data = _load_dataset_from_memory(path)
+    calendar = _build_calendar_features(data.index)
+    specs = [PlotSpec("bar", x=column, group_by=group)
+             for column in CATEGORICAL_COLUMNS for group in [None, *CATEGORICAL_COLUMNS]]
+
+    def prepare_all(cube=None):
+        for spec in specs:
+            prepare_plot(spec, data, calendar, cube)
+
+    # the first pass fills the cube, the later ones only read it
+    cube = CountCube(data, calendar)
+    timings = {
+        "scan of the dataset": _best_time(prepare_all, repeat),
+        "cube, first pass": _best_time(lambda: prepare_all(CountCube(data, calendar)), 1),
+        "cube, filled": _best_time(lambda: prepare_all(cube), repeat),
+    }
+    _report(f"Counting the {len(specs)} bar charts of the categorical columns over {len(data)} "
+            f"incidents", timings)
+
+
+def benchmark_filters(path=DATASET_PATH, repeat=5) -> None:
+    """Time the selection of the female victims in Brooklyn and the Bronx in 2019"""
+    data = _load_dataset_from_memory(path)
+    years = _build_calendar_features(data.index)["year"]
+    filters = {"VIC_SEX": ["F"], "BORO": ["BROOKLYN", "BRONX"], "YEAR": [2019]}
+
+    def scan():
+        return (data["VIC_SEX"].isin(filters["VIC_SEX"]).to_numpy()
+                & data["BORO"].isin(filters["BORO"]).to_numpy()
+                & years.isin(filters["YEAR"]).to_numpy())
+
+    index = BitmapIndex({"VIC_SEX": data["VIC_SEX"], "BORO": data["BORO"], "YEAR": years})
+    index.select(filters)
+    timings = {
+        "boolean scan of the columns": _best_time(scan, repeat),
+        "bitmap intersection": _best_time(lambda: index.select(filters), repeat),
+        "bitmap intersection and mask": _best_time(lambda: index.mask(index.select(filters)), repeat),
+    }
+    _report(f"Filtering {len(data)} incidents down to {index.count(index.select(filters))}", timings)
+
+
+def benchmark_date_range(path=DATASET_PATH, repeat=5) -> None:
+    """Time the selection of the incidents of 2019"""
+    data = _load_dataset_from_memory(path)
+    first, last = pd.Timestamp("2019-01-01"), pd.Timestamp("2019-12-31")
+
+    def scan():
+        return data[(data.index >= first) & (data.index < last + pd.Timedelta(days=1))]
+
+    timings = {
+        "boolean mask of the dates": _best_time(scan, repeat),
+        "binary search of the sorted index": _best_time(
+            lambda: data.iloc[_date_slice(data.index, first, last)], repeat),
+    }
+    _report(f"Selecting {len(scan())} of {len(data)} incidents by date", timings)
+
+
+def benchmark_spatial_index(path=DATASET_PATH, repeat=5) -> None:
+    """Time the lookup of the incidents of a few blocks of Manhattan"""
+    data = _load_dataset_from_memory(path)
+    longitudes, latitudes = data["Longitude"].to_numpy(), data["Latitude"].to_numpy()
+    region = (-73.96, -73.94, 40.79, 40.81)
+
+    def scan():
+        left, right, bottom, top = region
+        return np.flatnonzero((longitudes >= left) & (longitudes <= right)
+                              & (latitudes >= bottom) & (latitudes <= top))
+
+    index = SpatialIndex(longitudes, latitudes)
+    timings = {
+        "boolean scan of the coordinates": _best_time(scan, repeat),
+        "grid index lookup": _best_time(lambda: index.query(*region), repeat),
+    }
+    _report(f"Selecting the {len(index.query(*region))} of {len(data)} incidents of a region "
+            f"(index built in {_best_time(lambda: SpatialIndex(longitudes, latitudes), 1) * 1000:.1f} ms)",
+            timings)
+
+
+def benchmark_choropleth(path=DATASET_PATH, repeat=5) -> None:
+    """Time the map of the precincts when the metric changes"""
+    app = QApplication.instance() or QApplication([])
+    canvas = CreateCanvas()
+    data = _load_dataset_from_memory(path)
+    calendar = _build_calendar_features(data.index)
+    try:
+        geometry = load_region_geometry("PRECINCT")
+    except (OSError, ValueError) as error:
+        print(f"Skipping the map of the precincts: {error}")
+        return
+
+    # the map alternates between two metrics, as when the user switches between them
+    cube = CountCube(data, calendar, [*CATEGORICAL_COLUMNS, MURDER_COLUMN])
+    values = itertools.cycle([
+        prepare_plot(PlotSpec("choropleth", x="PRECINCT", metric=metric), data, calendar, cube)
+        .counts.reindex(geometry.names).to_numpy() for metric in ("Incidents", "Murders")])
+
+    def chart(read_geometry=False, recolour=False):
+        paths = geometry.paths
+        if read_geometry:
+            paths = load_region_geometry.__wrapped__("PRECINCT").paths
+        if not recolour:
+            canvas.clear()
+        canvas.plot_choropleth(paths, next(values), label="PRECINCT")
+        canvas.draw()
+
+    chart()
+    timings = {
+        "reading the geometry for every map": _best_time(lambda: chart(read_geometry=True), repeat),
+        "drawing the cached paths again": _best_time(chart, repeat),
+        "recolouring the regions on display": _best_time(lambda: chart(recolour=True), repeat),
+    }
+    _report(f"Mapping the {len(geometry.names)} precincts "
+            f"({sum(len(path.vertices) for path in geometry.paths)} vertices)", timings)
+
+
+BENCHMARKS = {
+    "load": benchmark_load,
+    "line_series": benchmark_line_series,
+    "kde": benchmark_kde,
+    "grouped_bar": benchmark_grouped_bar,
+    "count_cube": benchmark_count_cube,
+    "filters": benchmark_filters,
+    "date_range": benchmark_date_range,
+    "spatial_index": benchmark_spatial_index,
+    "choropleth": benchmark_choropleth,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the NYPD shooting program")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help=f"the benchmarks to run ({', '.join(BENCHMARKS)}), all of them by default")
+    arguments = parser.parse_args()
+
+    unknown = set(arguments.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    for name in arguments.benchmarks or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,99 @@
+"""
+This module contains the bitmap index behind the filters of the window.
+
+Every value of an indexed column has a bitmap of the incidents, one bit for each
+incident set when the incident has the value, packed eight incidents to a byte. A filter
+is evaluated by combining bitmaps, the bitmaps of the values chosen in a column with a
+bitwise or and the columns with a bitwise and, which reads one bit per incident for
+each value instead of comparing the values of every incident.
+
+"""
+
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from utilities import _category_codes
+
+# the number of bits set in each byte
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+class BitmapIndex:
+    """The bitmaps of the values of columns of the dataset, built for each column the
+    first time it is filtered
+
+    Parameter:
+    columns: dict
+        The values of the incidents (pd.Series) of each indexed column, by name. The
+        values of a column are listed in the order of its categories, in ascending order
+        for the other columns, the missing values are never selected.
+    missing: dict, optional
+        The value standing for the missing values of a column, by name, e.g.
+        CALENDAR_MISSING for the calendar features
+    """
+    def __init__(self, columns: Dict[str, pd.Series], missing: Dict[str, object] = None):
+        self.columns = columns
+        self.missing = missing or {}
+        self.size = len(next(iter(columns.values()))) if columns else 0
+        self._codes = {}
+        self._bitmaps = {}
+
+    def _column_codes(self, column: str):
+        """Return the code of every incident and the values of the codes of a column"""
+        if column not in self._codes:
+            codes, labels = _category_codes(self.columns[column], self.missing.get(column))
+            self._codes[column] = codes, pd.Index(labels)
+        return self._codes[column]
+
+    def labels(self, column: str) -> pd.Index:
+        """Return the values of a column which can be selected"""
+        return self._column_codes(column)[1]
+
+    def _column_bitmaps(self, column: str) -> np.ndarray:
+        """Return the bitmaps of the values of a column, one row for each value"""
+        if column not in self._bitmaps:
+            codes, labels = self._column_codes(column)
+            bitmaps = np.empty((len(labels), (self.size + 7) // 8), dtype=np.uint8)
+            for code in range(len(labels)):
+                bitmaps[code] = np.packbits(codes == code)
+            self._bitmaps[column] = bitmaps
+        return self._bitmaps[column]
+
+    def select(self, filters: Dict[str, Iterable]) -> Optional[np.ndarray]:
+        """Return the bitmap of the incidents matching the filters
+
+        Parameter:
+        filters: dict
+            The values selected in each column, by name. An incident matches when its
+            value is one of those selected in every column, the columns without any
+            value selected are ignored.
+
+        Returns None when no value is selected, i.e. when every incident matches.
+        """
+        selection = None
+        for column, values in filters.items():
+            codes = self.labels(column).get_indexer(list(values))
+            codes = codes[codes >= 0]
+            if len(codes) == 0:
+                continue
+            column_selection = np.bitwise_or.reduce(self._column_bitmaps(column)[codes], axis=0)
+            selection = column_selection if selection is None else selection & column_selection
+        return selection
+
+    @staticmethod
+    def count(bitmap: np.ndarray) -> int:
+        """Return the number of incidents of a bitmap"""
+        return int(_POPCOUNT[bitmap].sum(dtype=np.int64))
+
+    @staticmethod
+    def contains(bitmap: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Return whether each incident, given by its position, is in a bitmap"""
+        positions = np.asarray(positions, dtype=np.int64)
+        # packbits stores the first incident of a byte in its highest bit
+        return ((bitmap[positions >> 3] >> (7 - (positions & 7))) & 1).astype(bool)
+
+    def mask(self, bitmap: np.ndarray) -> np.ndarray:
+        """Return the boolean mask of the incidents of a bitmap"""
+        return np.unpackbits(bitmap, count=self.size).view(bool)
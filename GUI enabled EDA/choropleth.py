@@ -0,0 +1,119 @@
+"""
+This module contains the geometry of the map charts of the precincts and boroughs.
+
+The boundaries of the regions are read from the GeoJSON files of the Dataset folder the
+first time a map of the regions is drawn. Their vertices are simplified and projected
+once, and kept as one path for each region, so that a map of new counts only sets the
+colours of the regions on display instead of reading and drawing their boundaries again.
+
+"""
+
+import json
+import os
+from functools import lru_cache
+from typing import List, NamedTuple
+
+import numpy as np
+import pandas as pd
+from matplotlib.path import Path
+
+# the GeoJSON file of the boundaries of each region column and the property of its
+# features naming the region, as published on NYC Open Data
+GEOMETRY_FILES = {
+    "PRECINCT": ("../Dataset/Police_Precincts.geojson", "precinct"),
+    "BORO": ("../Dataset/Borough_Boundaries.geojson", "boro_name"),
+}
+# the vertices closer than the tolerance, in degrees (about 10 metres), are merged
+SIMPLIFY_TOLERANCE = 1e-4
+# the longitudes are scaled to the length of a degree of latitude at this latitude, so
+# that the map of New York is not stretched
+REFERENCE_LATITUDE = 40.7
+
+
+class RegionGeometry(NamedTuple):
+    """The projected boundaries of the regions, the path of each region (holes
+    included) listed in the order of the names"""
+    names: pd.Index
+    paths: List[Path]
+
+
+def region_name(value) -> str:
+    """Return the name of a region as written in the dataset and the geometry files,
+    e.g. the precinct 1 and the borough Brooklyn are named "1" and "BROOKLYN"."""
+    return str(value).strip().upper()
+
+
+def _project(points: np.ndarray) -> np.ndarray:
+    """Project the longitudes and latitudes so that a unit is the same length on both
+    axes"""
+    return points * [np.cos(np.radians(REFERENCE_LATITUDE)), 1.0]
+
+
+def _simplify_ring(ring) -> np.ndarray:
+    """Return the vertices of a ring snapped to the simplification grid, without the
+    vertices repeating the previous one. A ring reduced to less than 3 vertices is empty."""
+    if len(ring) == 0:
+        return np.empty((0, 2))
+    points = np.round(np.asarray(ring, dtype=np.float64)[:, :2] / SIMPLIFY_TOLERANCE) * SIMPLIFY_TOLERANCE
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+    points = points[keep]
+    # the ring is closed by its path, the last vertex repeating the first is dropped
+    if len(points) > 1 and np.array_equal(points[0], points[-1]):
+        points = points[:-1]
+    return points if len(points) >= 3 else points[:0]
+
+
+def _feature_rings(geometry: dict) -> list:
+    """Return the rings, outer boundaries and holes, of a Polygon or MultiPolygon"""
+    if geometry["type"] == "Polygon":
+        return list(geometry["coordinates"])
+    if geometry["type"] == "MultiPolygon":
+        return [ring for polygon in geometry["coordinates"] for ring in polygon]
+    raise ValueError(f"unsupported geometry type {geometry['type']!r}")
+
+
+def _ring_path(points: np.ndarray) -> Path:
+    """Return the closed path of the projected vertices of a ring"""
+    vertices = np.concatenate([_project(points), _project(points[:1])])
+    codes = np.full(len(vertices), Path.LINETO, dtype=Path.code_type)
+    codes[0], codes[-1] = Path.MOVETO, Path.CLOSEPOLY
+    return Path(vertices, codes)
+
+
+@lru_cache(maxsize=None)
+def load_region_geometry(column: str) -> RegionGeometry:
+    """Read the boundaries of the regions of a column (PRECINCT | BORO), the geometry is
+    read once for each column
+
+    Raises a FileNotFoundError if the geometry file is missing and a ValueError if it
+    does not hold the boundaries of the regions.
+    """
+    if column not in GEOMETRY_FILES:
+        raise ValueError(f"there is no map of the {column} regions, expected one of "
+                         f"{', '.join(GEOMETRY_FILES)}")
+    path, name_property = GEOMETRY_FILES[column]
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"the map of the {column} regions was not found at {path}")
+
+    with open(path) as geometry_file:
+        try:
+            features = json.load(geometry_file)["features"]
+        except (KeyError, TypeError) as error:
+            raise ValueError(f"{path} is not a GeoJSON feature collection") from error
+
+    # the rings of each region, the regions made of several features are merged
+    regions = {}
+    for feature in features:
+        try:
+            name = region_name(feature["properties"][name_property])
+            rings = _feature_rings(feature["geometry"])
+        except (KeyError, TypeError) as error:
+            raise ValueError(f"a feature of {path} has no {name_property} or geometry") from error
+        for ring in rings:
+            points = _simplify_ring(ring)
+            if len(points):
+                regions.setdefault(name, []).append(_ring_path(points))
+
+    names = sorted(regions)
+    return RegionGeometry(pd.Index(names), [Path.make_compound_path(*regions[name]) for name in names])
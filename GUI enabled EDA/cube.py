@@ -0,0 +1,119 @@
+"""
+This module contains the cube of incident counts behind the bar charts.
+
+The dimensions of the cube are the categorical columns of the dataset and the calendar
+features of the dates. Rather than the full cube, whose cells are mostly empty, the
+cube keeps the counts of every pair of dimensions a chart asked for, indexed by the
+category codes of both dimensions. A pair is counted with a single pass over the codes
+the first time it is needed, the later charts of the pair, and the charts of a single
+dimension of a counted pair, are answered by slicing and summing the stored counts
+without reading the dataset again.
+
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utilities import CALENDAR_MISSING, CATEGORICAL_COLUMNS, DATETIME_COLUMN, _category_codes
+
+# a dimension is a column and, for the date column, its calendar feature
+Dimension = Tuple[str, Optional[str]]
+
+
+class CountCube:
+    """The counts of the incidents for every combination of values of two dimensions
+
+    Parameter:
+    data: pd.DataFrame
+        The dataset
+    calendar: pd.DataFrame
+        The calendar features of the dataset, see _build_calendar_features
+    columns: list
+        The columns counted by the cube, the categorical columns by default. The date
+        column is always counted through its calendar features.
+    """
+    def __init__(self, data: pd.DataFrame, calendar: pd.DataFrame, columns=CATEGORICAL_COLUMNS):
+        self.data = data
+        self.calendar = calendar
+        self.columns = [column for column in columns if column in data.columns]
+        # the codes of each dimension, with their labels, categorical dtype and whether
+        # every incident has a code, and the counts of the dimensions and of their pairs
+        self._codes = {}
+        self._singles = {}
+        self._pairs = {}
+
+    def covers(self, column: str) -> bool:
+        """Return True if the cube counts the values of column"""
+        return column == DATETIME_COLUMN or column in self.columns
+
+    @staticmethod
+    def dimension(column: str, granularity: str = None) -> Dimension:
+        """Return the dimension of a column, the granularity only matters for the dates"""
+        return column, granularity if column == DATETIME_COLUMN else None
+
+    def _dimension_codes(self, dimension: Dimension):
+        """Return the code of every incident, the labels of the codes, the categorical
+        dtype of the values (None if they are not categorical) and whether every incident
+        has a code"""
+        if dimension not in self._codes:
+            column, granularity = dimension
+            values = self.data[column] if granularity is None else self.calendar[granularity]
+            # the incidents without a date are missing from the calendar dimensions
+            codes, labels = _category_codes(values, None if granularity is None else CALENDAR_MISSING)
+            dtype = values.dtype if isinstance(values.dtype, pd.CategoricalDtype) else None
+            self._codes[dimension] = (codes, pd.Index(labels, name=values.name), dtype,
+                                      bool((codes >= 0).all()))
+        return self._codes[dimension]
+
+    def _pair_counts(self, first: Dimension, second: Dimension) -> np.ndarray:
+        """Return the counts of the pairs of codes of two dimensions, one row for each
+        code of the first dimension and one column for each code of the second"""
+        if (second, first) in self._pairs:
+            return self._pairs[second, first].T
+        if (first, second) not in self._pairs:
+            first_codes, first_labels = self._dimension_codes(first)[:2]
+            second_codes, second_labels = self._dimension_codes(second)[:2]
+
+            # count every pair at once through a single code combining both codes
+            present = (first_codes >= 0) & (second_codes >= 0)
+            pairs = first_codes[present].astype(np.int64) * len(second_labels) + second_codes[present]
+            counts = np.bincount(pairs, minlength=len(first_labels) * len(second_labels))
+            self._pairs[first, second] = counts.reshape(len(first_labels), len(second_labels))
+        return self._pairs[first, second]
+
+    def _single_counts(self, dimension: Dimension) -> np.ndarray:
+        """Return the counts of the codes of a dimension"""
+        if dimension not in self._singles:
+            counts = None
+            for (first, second), pair in self._pairs.items():
+                # the incidents missing from the other dimension are not in the pair counts
+                if dimension == first and self._dimension_codes(second)[3]:
+                    counts = pair.sum(axis=1)
+                elif dimension == second and self._dimension_codes(first)[3]:
+                    counts = pair.sum(axis=0)
+                if counts is not None:
+                    break
+            else:
+                codes, labels = self._dimension_codes(dimension)[:2]
+                counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+            self._singles[dimension] = counts
+        return self._singles[dimension]
+
+    def value_counts(self, dimension: Dimension) -> pd.Series:
+        """Count the incidents for each value of a dimension, as Series.value_counts does:
+        the most frequent value first, the unused categories of categorical columns
+        included"""
+        labels, dtype = self._dimension_codes(dimension)[1:3]
+        name, labels = labels.name, labels.rename(None)
+        if dtype is not None:
+            labels = pd.CategoricalIndex(labels, dtype=dtype)
+        # sorted like value_counts sorts its counts, so that the ties are in the same order
+        return pd.Series(self._single_counts(dimension), index=labels, name=name).sort_values(ascending=False)
+
+    def crosstab(self, dimension: Dimension, group: Dimension) -> pd.DataFrame:
+        """Count the incidents for each pair of values of a dimension and a group, as
+        _count_crosstab does"""
+        labels, group_labels = self._dimension_codes(dimension)[1], self._dimension_codes(group)[1]
+        return pd.DataFrame(self._pair_counts(dimension, group), index=labels, columns=group_labels)
@@ -0,0 +1,186 @@
+"""
+This module contains the kernel density estimation used by the density charts.
+
+The points are binned onto a regular grid, each point being shared between its nearest
+grid nodes, and the binned counts are convolved with a gaussian kernel through the fast
+fourier transform. The cost therefore depends on the size of the grid rather than on the
+number of points times the size of the grid, as when every point's kernel is evaluated at
+every grid node.
+
+The bandwidth, support and normalisation follow seaborn's kdeplot defaults so that the
+charts look the same as before.
+
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# the number of grid nodes along each axis and how far past the extreme points, in
+# bandwidths, the grid extends
+GRIDSIZE = 200
+CUT = 3
+
+
+def _weighted_covariance(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Return the weighted covariance matrix of the values, one row for each dimension"""
+    return np.atleast_2d(np.cov(values, aweights=weights))
+
+
+def _scott_covariance(values: np.ndarray, weights: np.ndarray, bw_adjust: float = 1) -> np.ndarray:
+    """Return the covariance of the gaussian kernel, as chosen by Scott's rule
+
+    The effective number of points is used so that weighted points count as much as
+    their weight.
+    """
+    dimensions = values.shape[0]
+    effective_size = weights.sum() ** 2 / (weights ** 2).sum()
+    factor = effective_size ** (-1 / (dimensions + 4)) * bw_adjust
+    return _weighted_covariance(values, weights) * factor ** 2
+
+
+def _linear_binning(values: np.ndarray, weights: np.ndarray, grids: List[np.ndarray]) -> np.ndarray:
+    """Share the weight of every point between the grid nodes around it
+
+    Each node receives a part of the weight that decreases linearly with its distance to
+    the point, the grids are assumed to be regular and to contain every point.
+    """
+    shape = tuple(len(grid) for grid in grids)
+    positions, fractions = [], []
+    for dimension, grid in enumerate(grids):
+        position = (values[dimension] - grid[0]) / (grid[1] - grid[0])
+        lower = np.clip(np.floor(position).astype(np.int64), 0, len(grid) - 2)
+        positions.append(lower)
+        fractions.append(position - lower)
+
+    counts = np.zeros(int(np.prod(shape)))
+    # every combination of the lower and upper node along each dimension
+    for corner in np.ndindex(*(2,) * len(grids)):
+        index = np.ravel_multi_index([position + step for position, step in zip(positions, corner)], shape)
+        share = weights.copy()
+        for fraction, step in zip(fractions, corner):
+            share *= fraction if step else 1 - fraction
+        counts += np.bincount(index, share, minlength=counts.size)
+    return counts.reshape(shape)
+
+
+def _gaussian_kernel(grids: List[np.ndarray], covariance: np.ndarray) -> np.ndarray:
+    """Return the gaussian kernel sampled at every offset between two nodes of the grids"""
+    offsets = [np.arange(1 - len(grid), len(grid)) * (grid[1] - grid[0]) for grid in grids]
+    mesh = np.stack(np.meshgrid(*offsets, indexing="ij"), axis=-1)
+    precision = np.linalg.inv(covariance)
+    exponent = np.einsum("...i,ij,...j->...", mesh, precision, mesh)
+    norm = np.sqrt((2 * np.pi) ** len(grids) * np.linalg.det(covariance))
+    return np.exp(-exponent / 2) / norm
+
+
+def _fft_convolve(counts: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Convolve the counts with the kernel and return the result on the counts' grid"""
+    shape = [count + size - 1 for count, size in zip(counts.shape, kernel.shape)]
+    # powers of two are the fastest sizes for the transform
+    fft_shape = [1 << (size - 1).bit_length() for size in shape]
+    axes = tuple(range(counts.ndim))
+    convolved = np.fft.irfftn(np.fft.rfftn(counts, fft_shape) * np.fft.rfftn(kernel, fft_shape),
+                              fft_shape, axes=axes)
+    # the kernel is centred on its middle node
+    window = tuple(slice(count - 1, 2 * count - 1) for count in counts.shape)
+    return convolved[window]
+
+
+def binned_kde(values, weights=None, gridsize: int = GRIDSIZE, cut: float = CUT,
+               bw_adjust: float = 1) -> Optional[Tuple[List[np.ndarray], np.ndarray]]:
+    """Estimate the density of the values on a regular grid
+
+    Parameter:
+    values: array like
+        The values to estimate, a sequence of the points' coordinates along each
+        dimension (one or two of them)
+    weights: array like, optional
+        The weight of each point, every point weighs as much by default
+    gridsize: int
+        The number of grid nodes along each dimension
+    cut: float
+        How far past the extreme points, in bandwidths, the grid extends
+    bw_adjust: float
+        The factor scaling the bandwidth chosen by Scott's rule
+
+    Returns the grid along each dimension and the density at every grid node, or None
+    when the density is undefined, e.g. when all the values are the same.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    weights = np.ones(values.shape[1]) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    valid = np.isfinite(values).all(axis=0) & np.isfinite(weights)
+    values, weights = values[:, valid], weights[valid]
+    if values.shape[1] < 2 or weights.sum() <= 0:
+        return None
+
+    covariance = _scott_covariance(values, weights, bw_adjust)
+    if not np.isfinite(covariance).all() or np.linalg.det(covariance) <= 0:
+        return None
+
+    bandwidths = np.sqrt(np.diag(covariance))
+    grids = [np.linspace(low - bandwidth * cut, high + bandwidth * cut, gridsize)
+             for low, high, bandwidth in zip(values.min(axis=1), values.max(axis=1), bandwidths)]
+
+    counts = _linear_binning(values, weights, grids)
+    density = _fft_convolve(counts, _gaussian_kernel(grids, covariance)) / weights.sum()
+    # the transform leaves tiny negative round off errors where the density vanishes
+    return grids, np.clip(density, 0, None)
+
+
+def grouped_kde(values, groups: pd.Series, weights=None, common_norm: bool = True,
+                **kde_options) -> List[Tuple[object, List[np.ndarray], np.ndarray]]:
+    """Estimate the density of the values of each group
+
+    Parameter:
+    values: array like
+        The values to estimate, see binned_kde
+    groups: pd.Series
+        The group of each point, in the order the groups should be listed
+    weights: array like, optional
+        The weight of each point, every point weighs as much by default
+    common_norm: bool (default = True)
+        if True, the density of each group is scaled by the group's share of the total
+        weight, so that the densities of all the groups add up to one
+
+    Returns the group, the grid along each dimension and the density of every group
+    whose density is defined.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    weights = np.ones(values.shape[1]) if weights is None else np.asarray(weights, dtype=np.float64)
+    codes, labels = pd.factorize(pd.Series(groups.array), sort=True)
+    total = weights[codes >= 0].sum()
+
+    densities = []
+    for code, label in enumerate(labels):
+        member = codes == code
+        estimate = binned_kde(values[:, member], weights[member], **kde_options)
+        if estimate is None:
+            continue
+        grids, density = estimate
+        if common_norm:
+            density = density * (weights[member].sum() / total)
+        densities.append((label, grids, density))
+    return densities
+
+
+def estimate_densities(values, groups: pd.Series = None) -> List[Tuple[object, List[np.ndarray], np.ndarray]]:
+    """Estimate the density of the values, of each group if groups is given
+
+    Returns the group (None without groups), the grid along each dimension and the
+    density of every estimate, see grouped_kde.
+    """
+    if groups is not None:
+        return grouped_kde(values, groups)
+    estimate = binned_kde(values)
+    return [] if estimate is None else [(None, *estimate)]
+
+
+def contour_levels(density: np.ndarray, proportions) -> np.ndarray:
+    """Return the densities enclosing each proportion of the total density, lowest
+    proportion first"""
+    values = np.sort(density.ravel())[::-1]
+    cumulated = np.cumsum(values) / values.sum()
+    return np.take(values, np.searchsorted(cumulated, 1 - np.asarray(proportions)), mode="clip")
@@ -1,23 +1,39 @@
 
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+from dataclasses import replace
 
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT
+import numpy as np
+from matplotlib.widgets import RectangleSelector
 
 from main_interface import *
-from utilities import UtilityManager, CreateCanvas
+from utilities import (UtilityManager, CanvasManager, DatasetLoader, AggregationCache,
+                       PlotJobScheduler, RedrawScheduler, CALENDAR_MISSING, CATEGORICAL_COLUMNS)
+from bitmap_index import BitmapIndex
+from choropleth import load_region_geometry
+from cube import CountCube
+from plot_engine import MURDER_COLUMN, PlotSpec, PreparedPlot, prepare_plot, render_plot
+from spatial_index import SpatialIndex
 import resources
 
 
 class ControlCenter(MainInterface):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, memory_map=False, data=None):
         super(ControlCenter, self).__init__(parent)
         self.utility = UtilityManager()
-        self.load_dataset_to_memory()
+        # the density estimates are computed on a thread pool so that the window stays
+        # responsive, a new chart or new filters cancel the estimates of the previous one
+        self.plot_scheduler = PlotJobScheduler(self)
+        if data is None:
+            self.load_dataset_to_memory(memory_map)
+        else:
+            self.set_dataset(data)
 
         # default values
-        self.tool_bar = None
+        self.canvas_manager = CanvasManager(self, self.central_stack)
+        # the settings changed in quick succession are rendered in a single redraw
+        self.redraw_scheduler = RedrawScheduler(self.plot_data, merge=self.merge_redraw_axes,
+                                                parent=self)
+        self.line_series = None
+        self.line_points = None
         self.categorical_columns = [
             "BORO", "PRECINCT", "JURISDICTION_CODE", "LOCATION_DESC", "STATISTICAL_MURDER_FLAG",
             "PERP_AGE_GROUP", "PERP_SEX", "PERP_RACE", "VIC_AGE_GROUP", "VIC_SEX", "VIC_RACE",
@@ -28,13 +44,164 @@ class ControlCenter(MainInterface):
         self.previous_xaxis_index = 0
         self.previous_yaxis_index = 0
 
-    def load_dataset_to_memory(self):
-        self.data = self.utility.load_dataset_from_memory()
+    def load_dataset_to_memory(self, memory_map=False):
+        """Load the dataset, sharing the memory-mapped snapshot with the other windows
+        of the machine if memory_map is True"""
+        self.set_dataset(self.utility.load_dataset_from_memory(memory_map))
+
+    def set_dataset(self, data):
+        """Use an already loaded dataset and list its columns in the axis and filter
+        comboBoxes"""
+        self.full_data = data
+
+        # the calendar features of each incident are derived once rather than on every plot
+        self.full_calendar = self.utility.build_calendar_features(self.full_data.index)
+
+        # the filters are evaluated on the bitmaps of the values of the categorical
+        # columns and of the years
+        filter_columns = {column: self.full_data[column] for column in
+                          [*CATEGORICAL_COLUMNS, "STATISTICAL_MURDER_FLAG"]}
+        filter_columns["YEAR"] = self.full_calendar["year"]
+        self.bitmap_index = BitmapIndex(filter_columns, missing={"YEAR": CALENDAR_MISSING})
+        self.filters = {}
+
+        # the incidents of a region of the map are looked up in a grid of their coordinates
+        self.spatial_index = SpatialIndex(self.full_data["Longitude"], self.full_data["Latitude"])
+        self.region = None
+        self.region_selector = None
+
+        # the date range covers every incident, the index is sorted by time with the
+        # incidents without a time first
+        self.undated_incidents = int(self.full_data.index.isna().sum())
+        if self.undated_incidents < len(self.full_data):
+            first = self.full_data.index[self.undated_incidents].date()
+            last = self.full_data.index[-1].date()
+            for date_edit, date in ((self.first_date_dateEdit, first), (self.last_date_dateEdit, last)):
+                date_edit.blockSignals(True)
+                date_edit.setDateRange(QDate(first), QDate(last))
+                date_edit.setDate(QDate(date))
+                date_edit.blockSignals(False)
+
+        # the aggregations are cached by plot settings and by the state of the filters
+        # that produced self.data, which is None when the data is not filtered
+        self.aggregation_cache = AggregationCache()
+        self.apply_filters()
 
         data_columns = ["None", *self.data.columns]
         self.yaxis_comboBox.addItems(data_columns)
         self.xaxis_comboBox.addItems(data_columns)
         self.group_by_comboBox.addItems(data_columns)
+        self.filter_column_comboBox.addItems(self.bitmap_index.columns)
+
+    def apply_filters(self):
+        """Restrict self.data to the incidents of the date range matching the filters,
+        the values checked in a column are alternatives and the incidents must match
+        every column"""
+        # the chart being computed is for the previous filters
+        self.plot_scheduler.cancel()
+        filters = {column: values for column, values in self.filters.items() if values}
+
+        # the incidents are sorted by time, so the date range is a slice of the dataset.
+        # the full date range keeps the incidents without a time
+        window = slice(0, len(self.full_data))
+        if self.undated_incidents < len(self.full_data) and (
+                self.first_date_dateEdit.date() != self.first_date_dateEdit.minimumDate() or
+                self.last_date_dateEdit.date() != self.last_date_dateEdit.maximumDate()):
+            window = self.utility.date_slice(self.full_data.index,
+                                             self.first_date_dateEdit.date().toPyDate(),
+                                             self.last_date_dateEdit.date().toPyDate())
+        date_filter = () if window == slice(0, len(self.full_data)) else \
+            (("OCCUR_DATE_OCCUR_TIME", (window.start, window.stop)),)
+        region_filter = () if self.region is None else (("REGION", self.region),)
+        self.filter_state = tuple(filters.items()) + date_filter + region_filter or None
+
+        bitmap = self.bitmap_index.select(filters)
+        if self.region is not None:
+            # only the incidents of the region are read, through the spatial index
+            positions = self.spatial_index.query(*self.region)
+            positions = positions[(positions >= window.start) & (positions < window.stop)]
+            if bitmap is not None:
+                positions = positions[self.bitmap_index.contains(bitmap, positions)]
+            self.data, self.calendar = self.full_data.iloc[positions], self.full_calendar.iloc[positions]
+        else:
+            self.data, self.calendar = self.full_data.iloc[window], self.full_calendar.iloc[window]
+            if bitmap is not None:
+                mask = self.bitmap_index.mask(bitmap)[window]
+                self.data, self.calendar = self.data[mask], self.calendar[mask]
+
+        # the bar charts and the maps are counted from the cube, which counts each pair of
+        # columns once
+        self.count_cube = CountCube(self.data, self.calendar, [*CATEGORICAL_COLUMNS, MURDER_COLUMN])
+        region = "" if self.region is None else " in the selected region"
+        self.filter_count_label.setText(f"{len(self.data)} of {len(self.full_data)} incidents{region}")
+
+    def show_filter_values(self, column):
+        """List the values of the filter column, checking those selected"""
+        if column not in self.bitmap_index.columns:
+            return
+
+        selected = self.filters.get(column, ())
+        # the list is filled without changing the filters
+        self.filter_listWidget.blockSignals(True)
+        self.filter_listWidget.clear()
+        for label in self.bitmap_index.labels(column):
+            item = QListWidgetItem(str(label))
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if label in selected else Qt.Unchecked)
+            self.filter_listWidget.addItem(item)
+        self.filter_listWidget.blockSignals(False)
+
+    def change_filter(self):
+        """Select the values checked in the list of the filter column and redraw"""
+        column = self.filter_column_comboBox.currentText()
+        labels = self.bitmap_index.labels(column)
+        self.filters[column] = tuple(label for row, label in enumerate(labels)
+                                     if self.filter_listWidget.item(row).checkState() == Qt.Checked)
+        self.apply_filters()
+        self.redraw_scheduler.request()
+
+    def change_date_range(self):
+        """Select the incidents of the dates chosen and redraw"""
+        self.apply_filters()
+        self.redraw_scheduler.request()
+
+    def select_region(self, press, release):
+        """Select the incidents inside the rectangle dragged on the map and redraw"""
+        # the rectangle is only a selection when the toolbar is not zooming or panning
+        plot_key = self.canvas_manager.canvas.plot_key
+        if self.canvas_manager.tool_bar.mode or plot_key is None:
+            return
+        spec = plot_key[0]
+        x_range = sorted((press.xdata, release.xdata))
+        y_range = sorted((press.ydata, release.ydata))
+        longitudes, latitudes = (x_range, y_range) if spec.x == "Longitude" else (y_range, x_range)
+
+        self.region = (*longitudes, *latitudes)
+        self.apply_filters()
+        self.redraw_scheduler.request()
+
+    def connect_region_selector(self, spec: PlotSpec):
+        """Let the user drag a rectangle on the charts of the map to select its incidents"""
+        if self.region_selector is not None:
+            self.region_selector.disconnect_events()
+            self.region_selector = None
+
+        if spec.plot_type in ("scatter", "density") and {spec.x, spec.y} == {"Longitude", "Latitude"}:
+            self.region_selector = RectangleSelector(self.canvas_manager.canvas.axes, self.select_region,
+                                                     useblit=True, button=[1])
+
+    def clear_filters(self):
+        """Select every incident and redraw"""
+        self.filters = {}
+        self.region = None
+        self.show_filter_values(self.filter_column_comboBox.currentText())
+        for date_edit, date in ((self.first_date_dateEdit, self.first_date_dateEdit.minimumDate()),
+                                (self.last_date_dateEdit, self.last_date_dateEdit.maximumDate())):
+            date_edit.blockSignals(True)
+            date_edit.setDate(date)
+            date_edit.blockSignals(False)
+        self.apply_filters()
+        self.redraw_scheduler.request()
 
     def connect_slots(self):
         super(ControlCenter, self).connect_slots()
@@ -43,8 +210,13 @@ class ControlCenter(MainInterface):
         self.yaxis_comboBox.currentTextChanged.connect(lambda: self.slot_manager('y'))
         self.vertical_orientation_radioButton.clicked.connect(self.change_bar_plot_orientation)
         self.horizontal_orientation_radioButton.clicked.connect(self.change_bar_plot_orientation)
+        self.stack_bars_checkBox.clicked.connect(lambda: self.redraw_scheduler.request())
         self.set_scatter_transparency.valueChanged.connect(self.change_scatter_chart_transparency)
         self.shade_plot.clicked.connect(self.change_scatter_chart_shade)
+        self.rasterise_plot.clicked.connect(self.change_scatter_chart_shade)
+        self.line_aggregation_comboBox.currentTextChanged.connect(lambda: self.redraw_scheduler.request())
+        self.map_regions_comboBox.currentTextChanged.connect(lambda: self.redraw_scheduler.request())
+        self.map_metric_comboBox.currentTextChanged.connect(lambda: self.redraw_scheduler.request())
 
         self.xaxis_yearly_setting.clicked.connect(lambda: self.slot_manager('x'))
         self.xaxis_monthly_setting.clicked.connect(lambda: self.slot_manager('x'))
@@ -59,6 +231,12 @@ class ControlCenter(MainInterface):
         self.group_by_monthly_setting.clicked.connect(lambda: self.slot_manager("group_by"))
         self.group_by_yearly_setting.clicked.connect(lambda: self.slot_manager("group_by"))
 
+        self.filter_column_comboBox.currentTextChanged.connect(self.show_filter_values)
+        self.filter_listWidget.itemChanged.connect(self.change_filter)
+        self.clear_filters_button.clicked.connect(self.clear_filters)
+        self.first_date_dateEdit.dateChanged.connect(self.change_date_range)
+        self.last_date_dateEdit.dateChanged.connect(self.change_date_range)
+
     def slot_manager(self, axis):
         if self.plot_type_comboBox.currentText() == "None":
             if axis == "x":
@@ -73,7 +251,15 @@ class ControlCenter(MainInterface):
             elif axis == "group_by":
                 self.change_group_by_date_setting()
 
-            self.plot_data(axis)
+            self.redraw_scheduler.request(axis)
+
+    @staticmethod
+    def merge_redraw_axes(previous, axis):
+        """Return the axis a coalesced redraw is for. The change of an axis is kept over
+        the changes of the group by and the theme, which redraw the chart for any axis"""
+        if axis in (None, "group_by") and previous in ("x", "y"):
+            return previous
+        return axis
 
     def change_xaxis(self):
         """Change the x-axis scale of the initial empty chart to mimic the underlying data."""
@@ -107,7 +293,8 @@ class ControlCenter(MainInterface):
         theme = self.theme_comboBox.currentText()
         if theme.strip():
             mpl.style.use(theme)
-            self.plot_data()
+            self.canvas_manager.restyle()
+            self.redraw_scheduler.request()
 
     def change_chart_theme(self):
         condition = (
@@ -125,6 +312,8 @@ class ControlCenter(MainInterface):
         if self.plot_type_comboBox.currentText() == 'Bar plot':
             self.radio_group.setHidden(False)
             self.slider_group.setHidden(True)
+            self.line_group.setHidden(True)
+            self.map_group.setHidden(True)
             self.change_bar_plot_orientation()
 
             self.auto_change_style_comboBox("mpl")
@@ -133,21 +322,40 @@ class ControlCenter(MainInterface):
         elif self.plot_type_comboBox.currentText() == "Scatter plot":
             self.radio_group.setHidden(True)
             self.slider_group.setHidden(False)
+            self.line_group.setHidden(True)
+            self.map_group.setHidden(True)
 
             self.auto_change_style_comboBox("mpl")
 
         elif self.plot_type_comboBox.currentText() == "Line plot":
             self.radio_group.setHidden(True)
             self.slider_group.setHidden(True)
+            self.line_group.setHidden(False)
+            self.map_group.setHidden(True)
 
             self.auto_change_style_comboBox()
 
         elif self.plot_type_comboBox.currentText() == "Density plot":
             self.radio_group.setHidden(True)
             self.slider_group.setHidden(True)
+            self.line_group.setHidden(True)
+            self.map_group.setHidden(True)
 
             self.auto_change_style_comboBox("mpl")
 
+        elif self.plot_type_comboBox.currentText() == "Map plot":
+            self.radio_group.setHidden(True)
+            self.slider_group.setHidden(True)
+            self.line_group.setHidden(True)
+            self.map_group.setHidden(False)
+
+            # the regions are chosen in the map settings rather than on the axes
+            self.xaxis_comboBox.setDisabled(True)
+            self.yaxis_comboBox.setDisabled(True)
+
+            self.auto_change_style_comboBox("mpl")
+            return
+
         elif self.plot_type_comboBox.currentText() == "None":
             self.auto_change_style_comboBox()
 
@@ -202,10 +410,7 @@ class ControlCenter(MainInterface):
             self.group_by_date_settings_group.setHidden(True)
 
     def plot_vertical_bar_chart(self):
-        tick_labels = None
         if self.plot_type_comboBox.currentText() == "Bar plot":
-
-            # prepare the data
             column = self.xaxis_comboBox.currentText()
 
             if column == "None":
@@ -219,76 +424,12 @@ class ControlCenter(MainInterface):
                     self.xaxis_comboBox.setCurrentIndex(self.previous_xaxis_index)
                     return
 
-            data = self.data[column].value_counts()
-            # if the column data have intrinsic order, sort by that order
-            # rather than the default count order
-            if column in ["PERP_AGE_GROUP", "VIC_AGE_GROUP"]:
-                data = data.sort_index()
-
-            elif column in ["OCCUR_DATE_OCCUR_TIME"]:
-                # if the column feature is the datetime feature plot the chart
-                # as specified by the time frequency chosen by the user
-                if self.xaxis_daily_setting.isChecked():
-                    tick_labels = ["Mon", "Tue", "Wed", "Thurs", "Fri", "Sat", "Sun"]
-                    data = self.data.index.isocalendar().day.value_counts().sort_index()
-                elif self.xaxis_monthly_setting.isChecked():
-                    tick_labels = [
-                        "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sept", "Oct",
-                        "Nov", "Dec"
-                    ]
-                    data = self.data.index.month.value_counts().sort_index()
-                elif self.xaxis_yearly_setting.isChecked():
-                    data = self.data.index.year.value_counts().sort_index()
-
-            index, values = data.index, data.values
-
-            bar_canvas = CreateCanvas()
-            if self.group_by_comboBox.currentText() == "None":
-                bar_canvas.plot_bar_chart("Vertical", index, values, axis_label=column,
-                                          grid_on=True, grid_axis="y", tick_labels=tick_labels)
-            else:
-                hue = None
-                if self.group_by_comboBox.currentText() not in self.categorical_columns:
-                    # Warn the user
-                    message = "Grouping numerical features uses too much computer resources. Aborting..."
-                    QMessageBox().warning(self, "Invalid data", message)
-
-                    # plot the chart without grouping the data
-                    bar_canvas.plot_bar_chart("Vertical", index, values, axis_label=column,
-                                              grid_on=True, grid_axis="y", tick_labels=tick_labels)
-                elif self.group_by_comboBox.currentText() == "OCCUR_DATE_OCCUR_TIME":
-                    hue = self.date_setting_checker("group_by")
-                else:
-                    hue = self.group_by_comboBox.currentText()
-
-                if hue is None:
-                    bar_canvas.plot_bar_chart("Vertical", index, values, axis_label=column,
-                                              grid_on=True, grid_axis="y", tick_labels=tick_labels)
-                else:
-                    if column == "OCCUR_DATE_OCCUR_TIME":
-                        column = self.date_setting_checker("xaxis")
-
-                    sns.countplot(x=column, hue=hue, data=self.data, ax=bar_canvas.axes)
-
-            # rotate the angle of the label whose column who have longer names
-            if isinstance(column, str):
-                if column in ["LOCATION_DESC", "PERP_RACE", "VIC_RACE"]:
-                    bar_canvas.rotate_ticks()
-
-            plt.tight_layout()
-            if self.tool_bar is not None:
-                self.removeToolBar(self.tool_bar)
-            self.tool_bar = NavigationToolbar2QT(bar_canvas, self)
-            self.addToolBar(self.tool_bar)
-            self.setCentralWidget(bar_canvas)
+            self.draw_plot(self.plot_spec("bar", x=column, group_by=self.group_by_column()))
 
             self.previous_xaxis_index = self.xaxis_comboBox.currentIndex()
 
     def plot_horizontal_bar_chart(self):
-        tick_labels = None
         if self.plot_type_comboBox.currentText() == "Bar plot":
-
-            # prepare the data
             column = self.yaxis_comboBox.currentText()
 
             if column == "None":
@@ -302,79 +443,119 @@ class ControlCenter(MainInterface):
                     self.yaxis_comboBox.setCurrentIndex(self.previous_yaxis_index)
                     return
 
-            data = self.data[column].value_counts(ascending=True)
-            # if the column data have intrinsic order, sort by that order
-            # rather than the default count order
-            if column in ["PERP_AGE_GROUP", "VIC_AGE_GROUP"]:
-                data = data.sort_index(ascending=False)
-
-            elif column in ["OCCUR_DATE_OCCUR_TIME"]:
-                # if the column feature is the datetime feature plot the chart
-                # as specified by the time frequency chosen by the user
-                if self.yaxis_daily_setting.isChecked():
-                    tick_labels = ["Mon", "Tue", "Wed", "Thurs", "Fri", "Sat", "Sun"]
-                    data = self.data.index.isocalendar().day.value_counts().sort_index(ascending=True)
-                elif self.yaxis_monthly_setting.isChecked():
-                    tick_labels = [
-                        "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sept", "Oct",
-                        "Nov", "Dec"
-                    ]
-                    data = self.data.index.month.value_counts().sort_index()
-                elif self.yaxis_yearly_setting.isChecked():
-                    data = self.data.index.year.value_counts().sort_index()
-
-            index, values = data.index, data.values
-
-            bar_canvas = CreateCanvas()
-            if self.group_by_comboBox.currentText() == "None":
-                bar_canvas.plot_bar_chart("Horizontal", index, values, axis_label=column,
-                                          grid_on=True, grid_axis="x", tick_labels=tick_labels)
-            else:
-                hue = None
-                if self.group_by_comboBox.currentText() not in self.categorical_columns:
-                    # Warn the user
-                    message = "Grouping numerical features uses too much computer resources. " \
-                              "Aborting"
-                    QMessageBox().warning(self, "Invalid data", message)
-
-                    # plot the chart without grouping the data
-                    bar_canvas.plot_bar_chart("Horizontal", index, values, axis_label=column,
-                                              grid_on=True, grid_axis="x", tick_labels=tick_labels)
-                elif self.group_by_comboBox.currentText() == "OCCUR_DATE_OCCUR_TIME":
-                    hue = self.date_setting_checker("group_by")
-                else:
-                    hue = self.group_by_comboBox.currentText()
-
-                if hue is None:
-                    bar_canvas.plot_bar_chart("Horizontal", index, values, axis_label=column,
-                                              grid_on=True, grid_axis="x", tick_labels=tick_labels)
-                else:
-                    if column == "OCCUR_DATE_OCCUR_TIME":
-                        column = self.date_setting_checker("yaxis")
-
-                    sns.countplot(y=column, hue=hue, data=self.data, ax=bar_canvas.axes)
-
-            if self.tool_bar is not None:
-                self.removeToolBar(self.tool_bar)
-            self.tool_bar = NavigationToolbar2QT(bar_canvas, self)
-            self.addToolBar(self.tool_bar)
-            self.setCentralWidget(bar_canvas)
+            self.draw_plot(self.plot_spec("bar", y=column, group_by=self.group_by_column()))
 
             self.previous_yaxis_index = self.yaxis_comboBox.currentIndex()
 
+    def plot_spec(self, plot_type, x=None, y=None, group_by=None) -> PlotSpec:
+        """Return the spec of a chart of the given columns, with the settings chosen in
+        the window"""
+        return PlotSpec(plot_type, x=x, y=y, group_by=group_by,
+                        x_granularity=self.date_granularity("xaxis"),
+                        y_granularity=self.date_granularity("yaxis"),
+                        group_granularity=self.date_granularity("group_by"),
+                        stacked=self.stack_bars_checkBox.isChecked(),
+                        alpha=self.set_scatter_transparency.value() / 10,
+                        shade=self.shade_plot.isChecked(),
+                        rasterise=self.rasterise_plot.isChecked(),
+                        aggregation=self.line_aggregation_comboBox.currentText(),
+                        metric=self.map_metric_comboBox.currentText())
+
+    def group_by_column(self):
+        """Return the column grouping the chart, None if the chart is not grouped. The
+        user is warned that numerical columns cannot group the chart."""
+        group_by = self.group_by_comboBox.currentText()
+        if group_by == "None":
+            return None
+        if group_by not in self.categorical_columns:
+            message = "Grouping numerical features uses too much computer resources. Aborting..."
+            QMessageBox().warning(self, "Invalid data", message)
+            return None
+        return group_by
+
+    def prepared_plot_key(self, spec: PlotSpec) -> tuple:
+        """Return the key of the prepared data of the chart of spec in the aggregation
+        cache, the prepared data depend on the filters that produced self.data"""
+        return "plot", spec.data_spec(), self.filter_state
+
+    def prepared_plot(self, spec: PlotSpec) -> PreparedPlot:
+        """Return the data of the chart of spec, the prepared data are cached"""
+        data_spec = spec.data_spec()
+        return self.aggregation_cache.get(self.prepared_plot_key(spec),
+                                          lambda: prepare_plot(data_spec, self.data, self.calendar,
+                                                               self.count_cube))
+
+    def draw_plot(self, spec: PlotSpec):
+        """Draw the matplotlib chart of spec on the canvas. The density charts are
+        prepared on the thread pool, a chart already on display is not drawn again."""
+        canvas = self.canvas_manager.canvas
+        if canvas.plot_key == (spec, self.filter_state) and not canvas.restyle_pending:
+            self.canvas_manager.show()
+            return
+
+        if spec.plot_type != "density" or self.prepared_plot_key(spec) in self.aggregation_cache:
+            self.show_plot(spec, self.prepared_plot(spec))
+            return
+
+        def fail(message):
+            self.statusBar().showMessage(f"The density could not be estimated: {message}")
+
+        # start from an empty chart while the densities are estimated
+        self.canvas_manager.get_canvas()
+        self.canvas_manager.show()
+        self.statusBar().showMessage("Estimating the density...")
+
+        # the estimate is stored under the filters it was computed for, they may change
+        # before the job is cancelled
+        data_spec, data, calendar = spec.data_spec(), self.data, self.calendar
+        key = self.prepared_plot_key(spec)
+        self.plot_scheduler.submit(
+            lambda: prepare_plot(data_spec, data, calendar),
+            lambda prepared: self.show_plot(spec, self.aggregation_cache.get(key, lambda: prepared)),
+            fail)
+
+    def show_plot(self, spec: PlotSpec, prepared: PreparedPlot):
+        """Render the prepared chart of spec on the canvas and display it"""
+        # the bar charts and the maps only clear the canvas when their bars or regions change
+        canvas = self.canvas_manager.get_canvas(clear=spec.plot_type not in ("bar", "choropleth"))
+        render_plot(spec, prepared, canvas)
+        canvas.plot_key = (spec, self.filter_state)
+        self.connect_region_selector(spec)
+
+        self.canvas_manager.show()
+        self.show_cache_statistics()
+
+    def show_cache_statistics(self):
+        """Display the effectiveness of the aggregation cache in the status bar"""
+        info = self.aggregation_cache.info()
+        redraws = self.redraw_scheduler.info()
+        self.statusBar().showMessage(f"Aggregation cache: {info.hits} hits, {info.misses} misses "
+                                     f"({info.currsize}/{info.maxsize} entries, "
+                                     f"{info.nbytes / 2 ** 20:.0f}/{info.maxbytes / 2 ** 20:.0f} MB), "
+                                     f"{redraws.suppressed} redraws suppressed")
+
     def change_scatter_chart_transparency(self):
+        alpha = self.set_scatter_transparency.value() / 10
+        self.set_scatter_transparency.setToolTip(f"{alpha}")
+
+        # the scatter chart on display only needs its points redrawn
+        canvas = self.canvas_manager.canvas
+        if self.central_stack.currentWidget() is canvas and canvas.set_scatter_alpha(alpha):
+            if canvas.plot_key is not None:
+                spec, filter_state = canvas.plot_key
+                canvas.plot_key = (replace(spec, alpha=alpha), filter_state)
+            return
         self.plot_scatter_chart()
 
     def change_scatter_chart_shade(self):
-        if self.shade_plot.isChecked():
+        # the transparency only applies to the points drawn as markers
+        if self.shade_plot.isChecked() or self.rasterise_plot.isChecked():
             self.set_scatter_transparency.setDisabled(True)
         else:
             self.set_scatter_transparency.setDisabled(False)
         self.plot_scatter_chart()
 
     def plot_scatter_chart(self, axis=None):
-        x_tick_labels = False
-        y_tick_labels = False
         if self.plot_type_comboBox.currentText() == "Scatter plot":
 
             xaxis = self.xaxis_comboBox.currentText()
@@ -394,83 +575,8 @@ class ControlCenter(MainInterface):
                     QMessageBox().warning(self, "Invalid data", message)
                 return
 
-            xaxis = self.data[xaxis]
-            yaxis = self.data[yaxis]
-
-            x_label = xaxis.name
-            y_label = yaxis.name
-
-            # if the column of the axis is the datetime feature
-            # prepare the data to enable it display correctly
-            if xaxis.name == "OCCUR_DATE_OCCUR_TIME":
-
-                if self.xaxis_daily_setting.isChecked():
-                    if not self.shade_plot.isChecked():
-                        x_tick_labels = True
-                    x_label = "Day"
-                    xaxis = list(self.data.index.isocalendar().day)
-
-                elif self.xaxis_monthly_setting.isChecked():
-                    xaxis = self.data.index.month
-                    x_label = "Month"
-
-                xaxis = pd.Series(xaxis, index=self.data.index)
-
-            if yaxis.name == "OCCUR_DATE_OCCUR_TIME":
-
-                if self.yaxis_daily_setting.isChecked():
-                    if not self.shade_plot.isChecked():
-                        y_tick_labels = True
-                    y_label = "Day"
-                    yaxis = list(self.data.index.isocalendar().day)
-
-                elif self.yaxis_monthly_setting.isChecked():
-                    yaxis = self.data.index.month
-                    y_label = "Month"
-
-                yaxis = pd.Series(yaxis, self.data.index)
-
-            alpha = self.set_scatter_transparency.value() / 10
-            self.set_scatter_transparency.setToolTip(f"{alpha}")
-
-            scatter_canvas = CreateCanvas()
-
-            if self.group_by_comboBox.currentText() == "None":
-                scatter_canvas.plot_scatter_chart(xaxis, yaxis, x_label=x_label, y_label=y_label,
-                                                  x_tick_labels=x_tick_labels,
-                                                  y_tick_labels=y_tick_labels,
-                                                  fill=self.shade_plot.isChecked(),
-                                                  alpha=alpha, data=self.data)
-            else:
-                hue = None
-                if self.group_by_comboBox.currentText() not in self.categorical_columns:
-                    # warn the user
-                    message = "Grouping numerical features uses too much computer resources. " \
-                              "Aborting..."
-                    QMessageBox().warning(self, "Invalid data", message)
-
-                    # plot the chart without grouping the data
-                    scatter_canvas.plot_scatter_chart(xaxis, yaxis, x_label=x_label, y_label=y_label,
-                                                      x_tick_labels=x_tick_labels,
-                                                      y_tick_labels=y_tick_labels,
-                                                      fill=self.shade_plot.isChecked(),
-                                                      alpha=alpha)
-                elif self.group_by_comboBox.currentText() == "OCCUR_DATE_OCCUR_TIME":
-                    hue = self.date_setting_checker("group_by")
-                else:
-                    hue = self.group_by_comboBox.currentText()
-
-                scatter_canvas.plot_scatter_chart(xaxis, yaxis, x_label=x_label, y_label=y_label,
-                                                  x_tick_labels=x_tick_labels,
-                                                  y_tick_labels=y_tick_labels,
-                                                  fill=self.shade_plot.isChecked(),
-                                                  alpha=alpha, hue=hue, data=self.data)
-
-            if self.tool_bar is not None:
-                self.removeToolBar(self.tool_bar)
-            self.tool_bar = NavigationToolbar2QT(scatter_canvas, self)
-            self.addToolBar(self.tool_bar)
-            self.setCentralWidget(scatter_canvas)
+            self.set_scatter_transparency.setToolTip(f"{self.set_scatter_transparency.value() / 10}")
+            self.draw_plot(self.plot_spec("scatter", x=xaxis, y=yaxis, group_by=self.group_by_column()))
 
     def plot_line_chart(self, axis=None):
         if self.plot_type_comboBox.currentText() == "Line plot":
@@ -492,60 +598,26 @@ class ControlCenter(MainInterface):
                     QMessageBox().warning(self, "Invalid data", message)
                 return
 
-            xaxis = self.data[xaxis]
-            yaxis = self.data[yaxis]
+            prepared = self.prepared_plot(self.plot_spec("line", x=xaxis, y=yaxis))
 
+            # the date axes show the calendar feature chosen by the user
             self.axis_x = None
             self.axis_y = None
-
-            # if the column of the axis is the datetime feature
-            # prepare the data to enable it display correctly
-            if xaxis.name == "OCCUR_DATE_OCCUR_TIME":
-
-                self.axis_x = QValueAxis()
-                self.axis_x.setTitleText(xaxis.name)
-                self.axis_x.setLabelsEditable(False)
-                self.axis_x.setLabelFormat("%i")
-
-                if self.xaxis_daily_setting.isChecked():
-                    self.axis_x.setRange(1, 7)
-                    self.axis_x.setTickCount(7)
-                    xaxis = self.data.index.isocalendar().day
-
-                elif self.xaxis_monthly_setting.isChecked():
-                    self.axis_x.setRange(1, 12)
-                    self.axis_x.setTickCount(12)
-                    xaxis = self.data.index.month
-
-                elif self.xaxis_yearly_setting.isChecked():
-                    self.axis_x.setRange(xaxis.min().year, xaxis.max().year)
-                    self.axis_x.setTickCount((xaxis.max().year - xaxis.min().year) + 1)
-                    xaxis = self.data.index.year
-
-            if yaxis.name == "OCCUR_DATE_OCCUR_TIME":
-                self.axis_y = QValueAxis()
-                self.axis_y.setTitleText(yaxis.name)
-                self.axis_y.setLabelsEditable(False)
-                self.axis_y.setLabelFormat("%i")
-
-                if self.yaxis_daily_setting.isChecked():
-                    self.axis_y.setRange(1, 7)
-                    self.axis_y.setTickCount(7)
-                    yaxis = self.data.index.isocalendar().day
-
-                elif self.yaxis_monthly_setting.isChecked():
-                    self.axis_y.setRange(1, 12)
-                    self.axis_y.setTickCount(12)
-                    yaxis = self.data.index.month
-
-                elif self.yaxis_yearly_setting.isChecked():
-                    self.axis_y.setRange(yaxis.min().year, yaxis.max().year)
-                    self.axis_y.setTickCount((yaxis.max().year - yaxis.min().year) + 1)
-                    yaxis = self.data.index.year
-
+            if prepared.x_range is not None:
+                self.axis_x = self.date_value_axis(prepared.x_label, prepared.x_range)
+            if prepared.y_range is not None:
+                self.axis_y = self.date_value_axis(prepared.y_label, prepared.y_range)
+
+            # keep every point sorted along the x axis, the series only receives the
+            # points needed to draw the visible range at the width of the plot area
+            self.line_points = prepared.x, prepared.y
+            points = self.utility.downsample_min_max(*self.line_points, self.line_chart_width())
+
+            # hand every point to the series in a single call, appending them one by one
+            # makes the series signal and update on every point
             line_series = QLineSeries()
-            for x, y in zip(xaxis, yaxis):
-                line_series.append(x, y)
+            line_series.replace(self.utility.build_point_buffer(*points))
+            self.line_series = line_series
 
             try:
                 self.chart.removeAllSeries()
@@ -563,7 +635,7 @@ class ControlCenter(MainInterface):
                 self.chart.createDefaultAxes()
 
                 self.axis_x = self.chart.axes(Qt.Horizontal)
-                self.axis_x[0].setTitleText(xaxis.name)
+                self.axis_x[0].setTitleText(prepared.x_label)
 
             if self.axis_y is not None:
                 line_series.attachAxis(self.axis_y)
@@ -573,7 +645,7 @@ class ControlCenter(MainInterface):
                 self.chart.createDefaultAxes()
 
                 self.axis_y = self.chart.axes(Qt.Vertical)
-                self.axis_y[0].setTitleText(yaxis.name)
+                self.axis_y[0].setTitleText(prepared.y_label)
 
             if self.axis_x is None and self.axis_y is None:
                 self.chart.removeAxis(self.axis_x)
@@ -583,13 +655,68 @@ class ControlCenter(MainInterface):
                 self.axis_x = self.chart.axes(Qt.Horizontal)
                 self.axis_y = self.chart.axes(Qt.Vertical)
 
-                self.axis_x[0].setTitleText(xaxis.name)
-                self.axis_y[0].setTitleText(yaxis.name)
+                self.axis_x[0].setTitleText(prepared.x_label)
+                self.axis_y[0].setTitleText(prepared.y_label)
+            self.chart_view.setChart(self.chart)
+            self.canvas_manager.hide()
+            self.central_stack.setCurrentWidget(self.chart_view)
+
+            # downsample again whenever the chart is zoomed (drag a rectangle, right click
+            # to zoom out) or resized
+            self.chart_view.setRubberBand(QChartView.HorizontalRubberBand)
             try:
-                self.chart_view.setChart(self.chart)
-            except RuntimeError:
-                self.chart_view = QChartView(self.chart)
-            self.setCentralWidget(self.chart_view)
+                self.chart.plotAreaChanged.connect(self.refresh_line_series, Qt.UniqueConnection)
+            except TypeError:
+                # the chart is already connected
+                pass
+            for attached_axis in line_series.attachedAxes():
+                if attached_axis.orientation() == Qt.Horizontal:
+                    attached_axis.rangeChanged.connect(self.refresh_line_series)
+
+    @staticmethod
+    def date_value_axis(title, value_range) -> QValueAxis:
+        """Return the axis of the calendar feature of the dates in the line chart"""
+        first, last, tick_count = value_range
+        axis = QValueAxis()
+        axis.setTitleText(title)
+        axis.setLabelsEditable(False)
+        axis.setLabelFormat("%i")
+        axis.setRange(first, last)
+        axis.setTickCount(tick_count)
+        return axis
+
+    def line_chart_width(self) -> int:
+        """Return the width in pixels of the plot area of the line chart"""
+        width = int(self.chart.plotArea().width())
+        if width <= 0:
+            # the chart has not been laid out yet
+            width = self.chart_view.width()
+        return max(width, 1)
+
+    def refresh_line_series(self):
+        """Refill the line series with the points of the visible x range, downsampled to
+        the width of the plot area"""
+        if self.line_series is None or self.plot_type_comboBox.currentText() != "Line plot":
+            return
+
+        xaxis, yaxis = self.line_points
+        try:
+            attached_axes = self.line_series.attachedAxes()
+        except RuntimeError:
+            # the series was deleted along with its chart
+            self.line_series = None
+            return
+
+        for attached_axis in attached_axes:
+            if attached_axis.orientation() == Qt.Horizontal and isinstance(attached_axis, QValueAxis):
+                # keep one point on each side of the range to draw the line up to the border
+                start = max(np.searchsorted(xaxis, attached_axis.min(), "left") - 1, 0)
+                stop = np.searchsorted(xaxis, attached_axis.max(), "right") + 1
+                xaxis, yaxis = xaxis[start:stop], yaxis[start:stop]
+                break
+
+        points = self.utility.downsample_min_max(xaxis, yaxis, self.line_chart_width())
+        self.line_series.replace(self.utility.build_point_buffer(*points))
 
     def plot_density_chart(self, axis=None):
         if self.plot_type_comboBox.currentText() == "Density plot":
@@ -610,8 +737,6 @@ class ControlCenter(MainInterface):
                         return
                     QMessageBox().warning(self, "Invalid data", message)
 
-            density_canvas = CreateCanvas()
-
             if axis == "group_by":
                 if xaxis != "None":
                     axis = "x"
@@ -620,133 +745,37 @@ class ControlCenter(MainInterface):
 
             if xaxis in self.numerical_columns and yaxis in self.numerical_columns:
                 # if both axis contains valid data
-                xaxis = self.data[xaxis]
-                yaxis = self.data[yaxis]
-
-                x_label = xaxis.name
-                y_label = xaxis.name
-
-                if xaxis.name == "OCCUR_DATE_OCCUR_TIME":
-
-                    if self.xaxis_daily_setting.isChecked():
-                        xaxis = self.data.index.isocalendar().day
-                        x_label = "Day"
-                        xaxis = list(xaxis)
-
-                    elif self.xaxis_monthly_setting.isChecked():
-                        xaxis = self.data.index.month
-                        x_label = "Month"
-
-                    xaxis = pd.Series(xaxis, index=self.data.index)
-
-                if yaxis.name == "OCCUR_DATE_OCCUR_TIME":
-
-                    if self.yaxis_daily_setting.isChecked():
-                        yaxis = self.data.index.isocalendar().day
-                        y_label = "Day"
-                        yaxis = list(yaxis)
-
-                    elif self.yaxis_monthly_setting.isChecked():
-                        yaxis = self.data.index.month
-                        y_label = "Month"
-
-                    yaxis = pd.Series(yaxis, index=self.data.index)
-
-                if x_label == y_label:
-                    sns.histplot(x=xaxis, y=yaxis, ax=density_canvas.axes)
-                else:
-                    if self.group_by_comboBox.currentText() == "None":
-                        sns.kdeplot(x=xaxis, y=yaxis, fill=True, ax=density_canvas.axes)
-                    else:
-                        hue = None
-                        if self.group_by_comboBox.currentText() not in self.categorical_columns:
-                            message = "Grouping numerical features uses too much computer resources. Aborting..."
-                            QMessageBox().warning(self, "Invalid data", message)
-
-                            return
-                        else:
-                            if self.group_by_comboBox.currentText() == "OCCUR_DATE_OCCUR_TIME":
-                                hue = self.date_setting_checker("group_by")
-                            else:
-                                hue = self.group_by_comboBox.currentText()
-
-                            sns.kdeplot(x=xaxis, y=yaxis, fill=True, hue=hue, data=self.data,
-                                        ax=density_canvas.axes)
-
-                density_canvas.axes.set_xlabel(x_label)
-                density_canvas.axes.set_ylabel(y_label)
-
+                spec_axes = {"x": xaxis, "y": yaxis}
             elif axis == "x" and xaxis in self.numerical_columns:
-                # if only the xaxis contains valid data
-                xaxis = self.data[xaxis]
-                x_label = xaxis.name
-
-                if xaxis.name == "OCCUR_DATE_OCCUR_TIME":
-                    if self.xaxis_daily_setting.isChecked():
-                        xaxis = list(self.data.index.isocalendar().day)
-                    elif self.xaxis_monthly_setting.isChecked():
-                        xaxis = self.data.index.month
-
-                    xaxis = pd.Series(xaxis, index=self.data.index)
-
-                if self.group_by_comboBox.currentText() == "None":
-                    sns.kdeplot(x=xaxis, fill=True, ax=density_canvas.axes)
-                else:
-                    hue = None
-                    if self.group_by_comboBox.currentText() not in self.categorical_columns:
-                        message = "Grouping numerical features uses too much computer " \
-                                  "resouces. Aborting..."
-                        QMessageBox().warning(self, "Invalid data", message)
-
-                        return
-                    else:
-                        if self.group_by_comboBox.currentText() == "OCCUR_DATE_OCCUR_TIME":
-                            hue = self.date_setting_checker("group_by")
-                        else:
-                            hue = self.group_by_comboBox.currentText()
-
-                        sns.kdeplot(x=xaxis, fill=True, hue=hue, data=self.data, ax=density_canvas.axes)
-
-                density_canvas.axes.set_xlabel(x_label)
-
+                spec_axes = {"x": xaxis}
             elif axis == "y" and yaxis in self.numerical_columns:
-                yaxis = self.data[yaxis]
-                y_label = yaxis.name
-
-                if yaxis.name == "OCCUR_DATE_OCCUR_TIME":
-                    if self.yaxis_daily_setting.isChecked():
-                        yaxis = list(self.data.index.isocalendar().day)
-                    elif self.yaxis_monthly_setting.isChecked():
-                        yaxis = self.data.index.month
-
-                    yaxis = pd.Series(yaxis, index=self.data.index)
-
-                if self.group_by_comboBox.currentText() == "None":
-                    sns.kdeplot(y=yaxis, fill=True, ax=density_canvas.axes)
-                else:
-                    hue = None
-                    if self.group_by_comboBox.cuhbrrentText() not in self.categorical_columns:
-                        message = "Grouping numerical features uses too much computer resources. " \
-                                  "Aborting..."
-                        QMessageBox().warning(self, "Invalid data", message)
+                spec_axes = {"y": yaxis}
+            else:
+                self.canvas_manager.get_canvas()
+                self.canvas_manager.show()
+                return
 
-                        return
-                    else:
-                        if self.group_by_comboBox.currentText() == "OCCUR_DATE_OCCUR_TIME":
+            group_by = self.group_by_column()
+            if group_by is None and self.group_by_comboBox.currentText() != "None":
+                # the density of each group is not estimated for numerical groups
+                return
 
-                            hue = self.date_setting_checker("group_by")
-                        else:
-                            hue = self.group_by_comboBox.currentText()
+            self.draw_plot(self.plot_spec("density", group_by=group_by, **spec_axes))
 
-                        sns.kdeplot(y=yaxis, fill=True, hue=hue, data=self.data,
-                                    ax=density_canvas.axes)
-                density_canvas.axes.set_ylabel(y_label)
+    def plot_choropleth(self):
+        if self.plot_type_comboBox.currentText() == "Map plot":
+            column = self.map_regions_comboBox.currentText()
 
-            if self.tool_bar is not None:
-                self.removeToolBar(self.tool_bar)
-            self.tool_bar = NavigationToolbar2QT(density_canvas, self)
-            self.addToolBar(self.tool_bar)
-            self.setCentralWidget(density_canvas)
+            # the boundaries of the regions are read once, warn the user if they are missing
+            try:
+                load_region_geometry(column)
+            except (OSError, ValueError) as error:
+                self.canvas_manager.get_canvas()
+                self.canvas_manager.show()
+                QMessageBox().warning(self, "Missing map", f"The map could not be drawn: {error}")
+                return
+
+            self.draw_plot(self.plot_spec("choropleth", x=column))
 
     def plot_data(self, axis=None):
         """Plot the data as specified by the plot type using the appropriate plotting
@@ -754,6 +783,17 @@ class ControlCenter(MainInterface):
         plot_type = self.plot_type_comboBox.currentText()
         self.setCursor(self.utility.change_cursor("on"))
 
+        # the chart being computed is out of date
+        self.plot_scheduler.cancel()
+
+        if self.data.empty and plot_type != "None":
+            # the filters exclude every incident, display an empty chart
+            self.canvas_manager.get_canvas()
+            self.canvas_manager.show()
+            self.statusBar().showMessage("No incident matches the filters")
+            self.setCursor(self.utility.change_cursor("off"))
+            return
+
         if plot_type == "Bar plot":
             if self.xaxis_comboBox.isEnabled():
                 self.plot_vertical_bar_chart()
@@ -772,50 +812,61 @@ class ControlCenter(MainInterface):
                 axis = "group_by"
             self.plot_density_chart(axis)
 
-        self.setCursor(self.utility.change_cursor("off"))
-
-    def date_setting_checker(self, options: str) -> pd.Series:
-        """A validation function for the date option radio buttons."""
-        value = None
-        if options == "group_by":
-            if self.group_by_daily_setting.isChecked():
-                value = self.data.index.isocalendar().day
-            elif self.group_by_monthly_setting.isChecked():
-                value = self.data.index.month
-            elif self.group_by_yearly_setting.isChecked():
-                value = self.data.index.year
-        elif options == "xaxis":
-            if self.xaxis_daily_setting.isChecked():
-                value = self.data.index.isocalendar().day
-            elif self.xaxis_monthly_setting.isChecked():
-                value = self.data.index.month
-            elif self.xaxis_yearly_setting.isChecked():
-                value = self.data.index.year
-        elif options == "yaxis":
-            if self.yaxis_daily_setting.isChecked():
-                value = self.data.index.isocalendar().day
-            elif self.yaxis_monthly_setting.isChecked():
-                value = self.data.index.month
-            elif self.yaxis_yearly_setting.isChecked():
-                value = self.data.index.year
-
-        # convert value data to pd.Series having the same index with the
-        # main data to enable plotting as value
-        value = pd.Series(value, index=self.data.index)
-
-        return value
+        elif plot_type == "Map plot":
+            self.plot_choropleth()
 
+        self.setCursor(self.utility.change_cursor("off"))
 
-if __name__ == '__main__':
+    def date_granularity(self, options: str) -> str:
+        """Return the calendar feature (day, month or year) chosen by the date option
+        radio buttons."""
+        settings = {
+            "group_by": (self.group_by_daily_setting, self.group_by_monthly_setting),
+            "xaxis": (self.xaxis_daily_setting, self.xaxis_monthly_setting),
+            "yaxis": (self.yaxis_daily_setting, self.yaxis_monthly_setting),
+        }
+        daily_setting, monthly_setting = settings[options]
+        if daily_setting.isChecked():
+            return "day"
+        elif monthly_setting.isChecked():
+            return "month"
+        return "year"
+
+
+def main():
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(":/icon"))
     pixmap = QPixmap(":/splash_image")
     splash_screen = QSplashScreen(pixmap)
     splash_screen.show()
 
-    import time
-    time.sleep(5)
-    window = ControlCenter()
-    splash_screen.finish(window)
-    window.show()
+    # load the dataset off the GUI thread and display the window as soon as it is ready,
+    # several windows of the same machine can share the dataset pages
+    loader = DatasetLoader(memory_map="--memory-map" in sys.argv)
+    windows = []
+
+    def show_progress(percent, message):
+        splash_screen.showMessage(f"{message}... {percent}%", Qt.AlignBottom | Qt.AlignHCenter,
+                                  Qt.white)
+
+    def show_window(data):
+        window = ControlCenter(data=data)
+        windows.append(window)
+        splash_screen.finish(window)
+        window.show()
+
+    def show_error(message):
+        splash_screen.close()
+        QMessageBox().critical(None, "Dataset", f"The dataset could not be loaded: {message}")
+        app.quit()
+
+    loader.progress.connect(show_progress)
+    loader.loaded.connect(show_window)
+    loader.failed.connect(show_error)
+    loader.start()
+
     sys.exit(app.exec_())
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,8 @@ from PyQt5.QtWidgets import (
         QVBoxLayout, QFormLayout, QComboBox, QCheckBox, QSpacerItem, QGroupBox,
         QMainWindow, QSizePolicy, QLineEdit, QApplication, QWidget, QDockWidget,
         QRadioButton, QHBoxLayout, QMessageBox, QSlider, QScrollArea,
-        QSplashScreen
+        QSplashScreen, QStackedWidget, QListWidget, QListWidgetItem, QPushButton, QLabel,
+        QDateEdit
 )
 
 from PyQt5.QtCore import Qt, QDateTime, QDate
@@ -35,7 +36,7 @@ class MainInterface(QMainWindow):
         plot_setting_groupBox = QGroupBox("Plot Settings:")
 
         self.plot_type_comboBox = QComboBox()
-        items = ["None", "Bar plot", "Scatter plot", "Line plot", "Density plot"]
+        items = ["None", "Bar plot", "Scatter plot", "Line plot", "Density plot", "Map plot"]
         self.plot_type_comboBox.addItems(items)
 
         self.xaxis_comboBox = QComboBox()
@@ -47,10 +48,14 @@ class MainInterface(QMainWindow):
         # set vertical bar orientation as the default option
         self.vertical_orientation_radioButton.setChecked(True)
 
+        # stack the bars of the groups instead of placing them side by side
+        self.stack_bars_checkBox = QCheckBox("Stacked")
+
         self.radio_group = QGroupBox("Bar orientation")
         radio_layout = QHBoxLayout()
         radio_layout.addWidget(self.horizontal_orientation_radioButton)
         radio_layout.addWidget(self.vertical_orientation_radioButton)
+        radio_layout.addWidget(self.stack_bars_checkBox)
 
         self.radio_group.setLayout(radio_layout)
         self.radio_group.setHidden(True)
@@ -62,15 +67,44 @@ class MainInterface(QMainWindow):
         self.set_scatter_transparency.setValue(10)
 
         self.shade_plot = QCheckBox("")
+        self.rasterise_plot = QCheckBox("")
 
         self.slider_group = QGroupBox("Scatter plot setting")
         slider_layout = QFormLayout()
         slider_layout.addRow("alpha:", self.set_scatter_transparency)
         slider_layout.addRow("shade:", self.shade_plot)
+        slider_layout.addRow("rasterise:", self.rasterise_plot)
 
         self.slider_group.setLayout(slider_layout)
         self.slider_group.setHidden(True)
 
+        self.line_aggregation_comboBox = QComboBox()
+        items = [
+            "None", "Count", "Mean", "Median", "25th percentile", "75th percentile",
+            "90th percentile"
+        ]
+        self.line_aggregation_comboBox.addItems(items)
+
+        self.line_group = QGroupBox("Line plot setting")
+        line_layout = QFormLayout()
+        line_layout.addRow("aggregate:", self.line_aggregation_comboBox)
+
+        self.line_group.setLayout(line_layout)
+        self.line_group.setHidden(True)
+
+        self.map_regions_comboBox = QComboBox()
+        self.map_regions_comboBox.addItems(["PRECINCT", "BORO"])
+        self.map_metric_comboBox = QComboBox()
+        self.map_metric_comboBox.addItems(["Incidents", "Murders", "Murder rate"])
+
+        self.map_group = QGroupBox("Map plot setting")
+        map_layout = QFormLayout()
+        map_layout.addRow("regions:", self.map_regions_comboBox)
+        map_layout.addRow("metric:", self.map_metric_comboBox)
+
+        self.map_group.setLayout(map_layout)
+        self.map_group.setHidden(True)
+
         self.group_by_comboBox = QComboBox()
 
         self.xaxis_date_settings_group = QGroupBox("Date Settings (x axis):")
@@ -125,6 +159,8 @@ class MainInterface(QMainWindow):
         form_layout.addRow("Plot type:", self.plot_type_comboBox)
         form_layout.addWidget(self.radio_group)
         form_layout.addWidget(self.slider_group)
+        form_layout.addWidget(self.line_group)
+        form_layout.addWidget(self.map_group)
         form_layout.addRow("X axis:", self.xaxis_comboBox)
         form_layout.addWidget(self.xaxis_date_settings_group)
         form_layout.addRow("Y axis:", self.yaxis_comboBox)
@@ -135,6 +171,33 @@ class MainInterface(QMainWindow):
         form_layout.setVerticalSpacing(18)
         plot_setting_groupBox.setLayout(form_layout)
 
+        filter_groupBox = QGroupBox("Filters:")
+
+        # the incidents plotted occurred within the date range
+        self.first_date_dateEdit = QDateEdit()
+        self.last_date_dateEdit = QDateEdit()
+        for date_edit in (self.first_date_dateEdit, self.last_date_dateEdit):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("MM/dd/yyyy")
+
+        # the values checked in the list of a column restrict the incidents plotted
+        self.filter_column_comboBox = QComboBox()
+        self.filter_listWidget = QListWidget()
+        self.filter_listWidget.setMinimumHeight(160)
+        self.filter_count_label = QLabel()
+        self.clear_filters_button = QPushButton("Clear filters")
+
+        form_layout = QFormLayout()
+        form_layout.addRow("From:", self.first_date_dateEdit)
+        form_layout.addRow("To:", self.last_date_dateEdit)
+        form_layout.addRow("Column:", self.filter_column_comboBox)
+        form_layout.addRow(self.filter_listWidget)
+        form_layout.addRow(self.filter_count_label)
+        form_layout.addRow(self.clear_filters_button)
+
+        form_layout.setVerticalSpacing(18)
+        filter_groupBox.setLayout(form_layout)
+
         vertical_layout = QVBoxLayout()
         vertical_layout.addWidget(appearance_groupBox)
 
@@ -143,6 +206,11 @@ class MainInterface(QMainWindow):
 
         vertical_layout.addWidget(plot_setting_groupBox)
 
+        spacer = QSpacerItem(15, 14, QSizePolicy.Fixed, QSizePolicy.Fixed)
+        vertical_layout.addItem(spacer)
+
+        vertical_layout.addWidget(filter_groupBox)
+
         spacer = QSpacerItem(15, 10, QSizePolicy.Fixed, QSizePolicy.Expanding)
         vertical_layout.addItem(spacer)
 
@@ -206,7 +274,12 @@ class MainInterface(QMainWindow):
         self.chart_view.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
         self.connect_slots()
-        self.setCentralWidget(self.chart_view)
+
+        # the charts are displayed as pages of a stack so that switching between them
+        # does not delete them
+        self.central_stack = QStackedWidget()
+        self.central_stack.addWidget(self.chart_view)
+        self.setCentralWidget(self.central_stack)
 
         self.auto_change_style_comboBox()
 
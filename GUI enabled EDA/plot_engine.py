@@ -0,0 +1,401 @@
+"""
+This module contains the plotting core shared by the window, the batch renderer and the
+benchmarks.
+
+A chart is described by a PlotSpec. prepare_plot computes the data of the chart from
+the spec and the dataset, render_plot draws the prepared chart on a canvas. Neither reads
+the state of the widgets, the window only turns its settings into a spec, so that the
+prepared charts can be cached by their spec and the charts rendered from scripts.
+
+"""
+
+from dataclasses import dataclass, fields, replace
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+from choropleth import load_region_geometry, region_name
+from cube import CountCube
+from kde import estimate_densities
+from utilities import (DATETIME_COLUMN, ChartPlotter, _aggregate_by_bucket, _count_crosstab,
+                       _downsample_min_max, _sort_points)
+
+PLOT_TYPES = ["bar", "scatter", "line", "density", "choropleth"]
+GRANULARITIES = ["day", "month", "year"]
+AGGREGATIONS = ["None", "Count", "Mean", "Median", "25th percentile", "75th percentile",
+                "90th percentile"]
+# the regions of the map charts and the values they are coloured by
+REGION_COLUMNS = ["PRECINCT", "BORO"]
+METRICS = ["Incidents", "Murders", "Murder rate"]
+MURDER_COLUMN = "STATISTICAL_MURDER_FLAG"
+
+CALENDAR_LABELS = {"day": "Day", "month": "Month", "year": "Year"}
+BAR_TICK_LABELS = {
+    "day": ["Mon", "Tue", "Wed", "Thurs", "Fri", "Sat", "Sun"],
+    "month": ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sept", "Oct", "Nov", "Dec"],
+}
+# the columns whose values have an intrinsic order and the columns whose values have long
+# names, their tick labels are rotated on vertical bar charts
+ORDERED_COLUMNS = ["PERP_AGE_GROUP", "VIC_AGE_GROUP"]
+LONG_LABEL_COLUMNS = ["LOCATION_DESC", "PERP_RACE", "VIC_RACE"]
+
+
+class PlotSpecError(ValueError):
+    """The spec does not describe a chart of the dataset"""
+
+
+@dataclass(frozen=True)
+class PlotSpec:
+    """The description of a chart
+
+    Parameter:
+    plot_type: str (bar | scatter | line | density | choropleth)
+        The type of chart
+    x, y: str, optional
+        The columns on the x and y axis. A bar chart takes either of them, it is vertical
+        with x and horizontal with y, a density chart takes either or both of them. The
+        x column of a choropleth is its regions, see REGION_COLUMNS
+    group_by: str, optional
+        The column grouping the incidents
+    x_granularity, y_granularity, group_granularity: str (day | month | year)
+        The calendar feature of the date column on the x axis, y axis and group by
+    stacked: bool
+        if True, the bars of the groups are stacked
+    alpha: float
+        The opacity of the points of the scatter chart
+    shade, rasterise: bool
+        if True, the scatter chart is drawn as a density, respectively as an image
+    aggregation: str
+        The aggregation of the line chart values by time bucket, see AGGREGATIONS
+    metric: str
+        The value of the regions of the choropleth, see METRICS
+    """
+    plot_type: str
+    x: Optional[str] = None
+    y: Optional[str] = None
+    group_by: Optional[str] = None
+    x_granularity: str = "year"
+    y_granularity: str = "year"
+    group_granularity: str = "year"
+    stacked: bool = False
+    alpha: float = 1.0
+    shade: bool = False
+    rasterise: bool = False
+    aggregation: str = "None"
+    metric: str = "Incidents"
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "PlotSpec":
+        """Return the spec described by a dictionary, as read from a JSON file. The type
+        key gives the plot type and the granularity key the three granularities."""
+        values = dict(values)
+        if "type" in values:
+            values["plot_type"] = values.pop("type")
+        if "granularity" in values:
+            granularity = values.pop("granularity")
+            for key in ("x_granularity", "y_granularity", "group_granularity"):
+                values.setdefault(key, granularity)
+
+        names = {field.name for field in fields(cls)}
+        unknown = set(values) - names
+        if unknown:
+            raise PlotSpecError(f"unknown spec keys: {', '.join(sorted(unknown))}")
+        if "plot_type" not in values:
+            raise PlotSpecError("the spec has no plot type")
+        return cls(**values)
+
+    def data_spec(self) -> "PlotSpec":
+        """Return the spec without the settings which only change the look of the
+        chart, the charts of both specs share their prepared data"""
+        return replace(self, stacked=False, alpha=1.0)
+
+
+@dataclass
+class PreparedPlot:
+    """The data of a chart, ready to be drawn
+
+    The values of the axes are the values drawn, i.e. the calendar features of the
+    dates, the counts are those of the bar charts (a Series, or a DataFrame with one
+    column for each group) or the values of the regions of the choropleths, and the
+    estimates are those of the density charts. The
+    ranges are the (first, last, tick count) of the date axes of line charts.
+    """
+    x: object = None
+    y: object = None
+    groups: Optional[pd.Series] = None
+    x_label: Optional[str] = None
+    y_label: Optional[str] = None
+    counts: object = None
+    tick_labels: Optional[list] = None
+    x_day_ticks: bool = False
+    y_day_ticks: bool = False
+    x_range: Optional[tuple] = None
+    y_range: Optional[tuple] = None
+    estimates: Optional[list] = None
+
+
+def _check_spec(spec: PlotSpec, data: pd.DataFrame) -> None:
+    """Raise a PlotSpecError if the spec does not describe a chart of the dataset"""
+    if spec.plot_type not in PLOT_TYPES:
+        raise PlotSpecError(f"unknown plot type {spec.plot_type!r}, expected one of "
+                            f"{', '.join(PLOT_TYPES)}")
+    for key in ("x", "y", "group_by"):
+        column = getattr(spec, key)
+        if column is not None and column not in data.columns:
+            raise PlotSpecError(f"unknown column {column!r} for {key}")
+    for key in ("x_granularity", "y_granularity", "group_granularity"):
+        if getattr(spec, key) not in GRANULARITIES:
+            raise PlotSpecError(f"unknown {key} {getattr(spec, key)!r}")
+    if spec.aggregation not in AGGREGATIONS:
+        raise PlotSpecError(f"unknown aggregation {spec.aggregation!r}")
+    if spec.metric not in METRICS:
+        raise PlotSpecError(f"unknown metric {spec.metric!r}")
+
+    if spec.plot_type == "bar" and (spec.x is None) == (spec.y is None):
+        raise PlotSpecError("a bar chart needs either an x or a y column")
+    if spec.plot_type in ("scatter", "line") and (spec.x is None or spec.y is None):
+        raise PlotSpecError(f"a {spec.plot_type} chart needs an x and a y column")
+    if spec.plot_type == "density" and spec.x is None and spec.y is None:
+        raise PlotSpecError("a density chart needs an x or a y column")
+    if spec.plot_type == "choropleth" and spec.x not in REGION_COLUMNS:
+        raise PlotSpecError(f"a choropleth needs an x column among {', '.join(REGION_COLUMNS)}")
+
+
+def _column_values(data: pd.DataFrame, calendar: pd.DataFrame, column: str, granularity: str,
+                   keep_years=False) -> (pd.Series, str):
+    """Return the values of a column and their label. The dates are replaced by their
+    calendar feature, except the years when keep_years is True."""
+    if column != DATETIME_COLUMN or (keep_years and granularity == "year"):
+        return data[column], column
+    return calendar[granularity], CALENDAR_LABELS[granularity]
+
+
+def _group_values(spec: PlotSpec, data: pd.DataFrame, calendar: pd.DataFrame) -> Optional[pd.Series]:
+    """Return the group of every incident, None if the chart is not grouped"""
+    if spec.group_by is None:
+        return None
+    return _column_values(data, calendar, spec.group_by, spec.group_granularity)[0]
+
+
+def _prepare_bar(spec: PlotSpec, data: pd.DataFrame, calendar: pd.DataFrame,
+                 cube: CountCube = None) -> PreparedPlot:
+    column = spec.x if spec.x is not None else spec.y
+    granularity = spec.x_granularity if spec.x is not None else spec.y_granularity
+    date_granularity = granularity if column == DATETIME_COLUMN else None
+    values = data[column] if date_granularity is None else calendar[date_granularity]
+    groups = _group_values(spec, data, calendar)
+
+    # the counts are read from the cube when it counts the columns of the chart
+    dimensions = None
+    if cube is not None and cube.covers(column) and (groups is None or cube.covers(spec.group_by)):
+        dimensions = (cube.dimension(column, granularity),
+                      cube.dimension(spec.group_by, spec.group_granularity))
+
+    if groups is not None:
+        counts = _count_crosstab(values, groups) if dimensions is None else cube.crosstab(*dimensions)
+    else:
+        counts = values.value_counts() if dimensions is None else cube.value_counts(dimensions[0])
+        # if the column data have intrinsic order, sort by that order rather than the
+        # default count order
+        if date_granularity is not None or column in ORDERED_COLUMNS:
+            counts = counts.sort_index()
+        # horizontal bars are drawn from the bottom, reverse the order of the vertical
+        # chart except for the dates which are always displayed ascending
+        if spec.y is not None and date_granularity is None:
+            counts = counts.iloc[::-1]
+
+    # the days and months are named after the bars drawn, a date range or a filter may
+    # leave only part of the week or the year
+    tick_labels = None
+    if groups is None and date_granularity in BAR_TICK_LABELS:
+        tick_labels = [BAR_TICK_LABELS[date_granularity][value - 1] for value in counts.index]
+
+    return PreparedPlot(counts=counts, x_label=column, groups=groups, tick_labels=tick_labels)
+
+
+def _prepare_scatter(spec: PlotSpec, data: pd.DataFrame, calendar: pd.DataFrame) -> PreparedPlot:
+    xaxis, x_label = _column_values(data, calendar, spec.x, spec.x_granularity, keep_years=True)
+    yaxis, y_label = _column_values(data, calendar, spec.y, spec.y_granularity, keep_years=True)
+    # the days of the week are labelled by name, except on the shaded chart
+    return PreparedPlot(x=xaxis, y=yaxis, groups=_group_values(spec, data, calendar),
+                        x_label=x_label, y_label=y_label,
+                        x_day_ticks=x_label == "Day" and not spec.shade,
+                        y_day_ticks=y_label == "Day" and not spec.shade)
+
+
+def _date_range(values: pd.Series, granularity: str) -> tuple:
+    """Return the first and last value and the number of ticks of a date axis"""
+    if granularity == "day":
+        return 1, 7, 7
+    elif granularity == "month":
+        return 1, 12, 12
+    first, last = int(values.min()), int(values.max())
+    return first, last, last - first + 1
+
+
+def _prepare_line(spec: PlotSpec, data: pd.DataFrame, calendar: pd.DataFrame) -> PreparedPlot:
+    xaxis, _ = _column_values(data, calendar, spec.x, spec.x_granularity)
+    yaxis, _ = _column_values(data, calendar, spec.y, spec.y_granularity)
+    x_range = _date_range(xaxis, spec.x_granularity) if spec.x == DATETIME_COLUMN else None
+    y_range = _date_range(yaxis, spec.y_granularity) if spec.y == DATETIME_COLUMN else None
+
+    # aggregate the values of the other axis by the chosen time bucket, the chart then
+    # holds one point per bucket instead of one point per incident
+    if spec.aggregation != "None" and (x_range is None) != (y_range is None):
+        if x_range is not None:
+            aggregated = _aggregate_by_bucket(xaxis, yaxis, spec.aggregation)
+            xaxis, yaxis = aggregated.index, aggregated
+        else:
+            aggregated = _aggregate_by_bucket(yaxis, xaxis, spec.aggregation)
+            xaxis, yaxis = aggregated, aggregated.index
+
+    # every point sorted along the x axis, ready to be downsampled to the visible range
+    xaxis, yaxis = _sort_points(xaxis, yaxis)
+    return PreparedPlot(x=xaxis, y=yaxis, x_label=spec.x, y_label=spec.y,
+                        x_range=x_range, y_range=y_range)
+
+
+def _prepare_density(spec: PlotSpec, data: pd.DataFrame, calendar: pd.DataFrame) -> PreparedPlot:
+    prepared = PreparedPlot(groups=_group_values(spec, data, calendar))
+    if spec.x is not None:
+        prepared.x, prepared.x_label = _column_values(data, calendar, spec.x, spec.x_granularity)
+    if spec.y is not None:
+        prepared.y, prepared.y_label = _column_values(data, calendar, spec.y, spec.y_granularity)
+
+    # the density of a feature against itself is drawn as a histogram
+    if prepared.x_label is None or prepared.x_label != prepared.y_label:
+        values = [np.asarray(axis, dtype=np.float64) for axis in (prepared.x, prepared.y)
+                  if axis is not None]
+        prepared.estimates = estimate_densities(values, prepared.groups)
+    return prepared
+
+
+def _prepare_choropleth(spec: PlotSpec, data: pd.DataFrame, calendar: pd.DataFrame,
+                        cube: CountCube = None) -> PreparedPlot:
+    # the incidents and murders of each region, read from the cube when it counts both
+    if cube is not None and cube.covers(spec.x) and cube.covers(MURDER_COLUMN):
+        crosstab = cube.crosstab(cube.dimension(spec.x), cube.dimension(MURDER_COLUMN))
+    else:
+        crosstab = _count_crosstab(data[spec.x], data[MURDER_COLUMN])
+
+    incidents = crosstab.sum(axis=1)
+    murders = crosstab[True] if True in crosstab.columns else incidents * 0
+    if spec.metric == "Incidents":
+        values = incidents
+    elif spec.metric == "Murders":
+        values = murders
+    else:
+        # the rate of the regions without incidents is missing
+        values = murders / incidents.where(incidents > 0)
+
+    values = pd.Series(values.to_numpy(dtype=np.float64), index=values.index.map(region_name))
+    return PreparedPlot(counts=values, x_label=spec.x, y_label=spec.metric)
+
+
+PREPARERS = {
+    "bar": _prepare_bar,
+    "scatter": _prepare_scatter,
+    "line": _prepare_line,
+    "density": _prepare_density,
+    "choropleth": _prepare_choropleth,
+}
+
+
+def prepare_plot(spec: PlotSpec, data: pd.DataFrame, calendar: pd.DataFrame,
+                 cube: CountCube = None) -> PreparedPlot:
+    """Compute the data of the chart described by spec
+
+    Parameter:
+    spec: PlotSpec
+        The chart to prepare
+    data: pd.DataFrame
+        The dataset
+    calendar: pd.DataFrame
+        The calendar features of the dataset, see _build_calendar_features
+    cube: CountCube, optional
+        The counts of the dataset answering the bar charts and the choropleths, the
+        incidents are counted from the dataset without it
+
+    Raises a PlotSpecError if the spec does not describe a chart of the dataset. The
+    charts of the date column leave out the incidents without a date.
+    """
+    _check_spec(spec, data)
+    if DATETIME_COLUMN in (spec.x, spec.y, spec.group_by) and data.index.hasnans:
+        # the incidents without a date have no place on a chart of the dates
+        dated = data.index.notna()
+        data, calendar = data[dated], calendar[dated]
+    if spec.plot_type in ("bar", "choropleth"):
+        return PREPARERS[spec.plot_type](spec, data, calendar, cube)
+    return PREPARERS[spec.plot_type](spec, data, calendar)
+
+
+def _render_bar(spec: PlotSpec, prepared: PreparedPlot, canvas: ChartPlotter) -> None:
+    orientation, grid_axis = ("Vertical", "y") if spec.x is not None else ("Horizontal", "x")
+    if prepared.groups is not None:
+        canvas.plot_grouped_bar_chart(orientation, prepared.counts, axis_label=prepared.x_label,
+                                      grid_on=True, grid_axis=grid_axis, stacked=spec.stacked)
+    else:
+        canvas.plot_bar_chart(orientation, prepared.counts.index, prepared.counts.values,
+                              axis_label=prepared.x_label, grid_on=True, grid_axis=grid_axis,
+                              tick_labels=prepared.tick_labels)
+
+    if orientation == "Vertical" and prepared.x_label in LONG_LABEL_COLUMNS:
+        canvas.rotate_ticks()
+
+
+def _render_scatter(spec: PlotSpec, prepared: PreparedPlot, canvas: ChartPlotter) -> None:
+    canvas.plot_scatter_chart(prepared.x, prepared.y, x_label=prepared.x_label,
+                              y_label=prepared.y_label, x_tick_labels=prepared.x_day_ticks,
+                              y_tick_labels=prepared.y_day_ticks, fill=spec.shade,
+                              alpha=spec.alpha, hue=prepared.groups, rasterise=spec.rasterise)
+
+
+def _render_line(spec: PlotSpec, prepared: PreparedPlot, canvas: ChartPlotter) -> None:
+    width = max(int(canvas.axes.bbox.width), 1)
+    canvas.axes.plot(*_downsample_min_max(prepared.x, prepared.y, width))
+    canvas.axes.set_xlabel(prepared.x_label)
+    canvas.axes.set_ylabel(prepared.y_label)
+
+
+def _render_density(spec: PlotSpec, prepared: PreparedPlot, canvas: ChartPlotter) -> None:
+    if prepared.estimates is None:
+        sns.histplot(x=prepared.x, y=prepared.y, ax=canvas.axes)
+    else:
+        canvas.plot_density(prepared.x, prepared.y, prepared.groups, prepared.estimates)
+    if prepared.x_label:
+        canvas.axes.set_xlabel(prepared.x_label)
+    if prepared.y_label:
+        canvas.axes.set_ylabel(prepared.y_label)
+
+
+def _render_choropleth(spec: PlotSpec, prepared: PreparedPlot, canvas: ChartPlotter) -> None:
+    geometry = load_region_geometry(spec.x)
+    # the regions of the map without incidents in the dataset count none
+    values = prepared.counts.reindex(geometry.names)
+    if spec.metric != "Murder rate":
+        values = values.fillna(0)
+    canvas.plot_choropleth(geometry.paths, values.to_numpy(),
+                           label=f"{spec.metric} by {prepared.x_label}")
+
+
+RENDERERS = {
+    "bar": _render_bar,
+    "scatter": _render_scatter,
+    "line": _render_line,
+    "density": _render_density,
+    "choropleth": _render_choropleth,
+}
+
+
+def render_plot(spec: PlotSpec, prepared: PreparedPlot, canvas: ChartPlotter) -> None:
+    """Draw the chart of spec, prepared by prepare_plot, on the canvas
+
+    The canvas must be cleared beforehand, except for the bar charts and the
+    choropleths which clear it themselves unless they only update the bars or the
+    colours of the regions on display.
+
+    Raises a FileNotFoundError if the map of the regions of a choropleth is missing.
+    """
+    RENDERERS[spec.plot_type](spec, prepared, canvas)
@@ -0,0 +1,84 @@
+"""
+This module contains the spatial index of the incidents' coordinates.
+
+The area covered by the incidents is split into a regular grid of cells. The incidents
+are sorted by cell once, and the offset of the first incident of every cell is kept, so
+that the incidents of a row of cells are a single slice of the sorted incidents. A
+rectangle is then looked up by reading the slices of the rows of cells it overlaps, only
+the incidents of those cells have their coordinates compared with the rectangle.
+
+"""
+
+import numpy as np
+
+# the average number of incidents of a cell and the largest number of cells along an
+# axis, the cells of the grid are square in degrees
+POINTS_PER_CELL = 16
+MAX_CELLS = 1024
+
+
+class SpatialIndex:
+    """A uniform grid index of points, built once for all the queries
+
+    Parameter:
+    xaxis, yaxis: array like
+        The coordinates of the points, e.g. the longitude and latitude of the incidents.
+        The points missing a coordinate are never returned.
+    """
+    def __init__(self, xaxis, yaxis):
+        self.xaxis = np.asarray(xaxis)
+        self.yaxis = np.asarray(yaxis)
+        valid = np.flatnonzero(np.isfinite(self.xaxis) & np.isfinite(self.yaxis))
+
+        if len(valid):
+            x, y = self.xaxis[valid], self.yaxis[valid]
+            self.extent = (float(x.min()), float(x.max()), float(y.min()), float(y.max()))
+        else:
+            self.extent = (0.0, 1.0, 0.0, 1.0)
+        left, right, bottom, top = self.extent
+
+        # square cells holding POINTS_PER_CELL points on average
+        area = max(right - left, 1e-12) * max(top - bottom, 1e-12)
+        self.cell_size = np.sqrt(area * POINTS_PER_CELL / max(len(valid), 1))
+        self.columns = int(np.clip(np.ceil((right - left) / self.cell_size), 1, MAX_CELLS))
+        self.rows = int(np.clip(np.ceil((top - bottom) / self.cell_size), 1, MAX_CELLS))
+
+        cells = (self._row(self.yaxis[valid]) * self.columns + self._column(self.xaxis[valid]))
+        # the points sorted by cell, a stable sort keeps the points of a cell in order
+        order = np.argsort(cells, kind="stable")
+        self.positions = valid[order]
+        self.offsets = np.zeros(self.rows * self.columns + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.rows * self.columns), out=self.offsets[1:])
+
+    def _column(self, xaxis) -> np.ndarray:
+        """Return the column of cells of the x coordinates, clipped to the grid"""
+        left, right = self.extent[:2]
+        columns = np.floor((np.asarray(xaxis, dtype=np.float64) - left) / (right - left or 1) * self.columns)
+        return np.clip(columns, 0, self.columns - 1).astype(np.int64)
+
+    def _row(self, yaxis) -> np.ndarray:
+        """Return the row of cells of the y coordinates, clipped to the grid"""
+        bottom, top = self.extent[2:]
+        rows = np.floor((np.asarray(yaxis, dtype=np.float64) - bottom) / (top - bottom or 1) * self.rows)
+        return np.clip(rows, 0, self.rows - 1).astype(np.int64)
+
+    def query(self, left: float, right: float, bottom: float, top: float) -> np.ndarray:
+        """Return the positions, in ascending order, of the points inside the rectangle,
+        borders included"""
+        grid_left, grid_right, grid_bottom, grid_top = self.extent
+        if right < grid_left or left > grid_right or top < grid_bottom or bottom > grid_top \
+                or left > right or bottom > top:
+            return np.empty(0, dtype=np.int64)
+
+        first_column, last_column = self._column([left, right])
+        first_row, last_row = self._row([bottom, top])
+
+        # the cells of a row overlapping the rectangle are contiguous
+        rows = np.arange(first_row, last_row + 1) * self.columns
+        starts = self.offsets[rows + first_column]
+        stops = self.offsets[rows + last_column + 1]
+        candidates = np.concatenate([self.positions[start:stop] for start, stop in zip(starts, stops)])
+
+        x, y = self.xaxis[candidates], self.yaxis[candidates]
+        inside = (x >= left) & (x <= right) & (y >= bottom) & (y <= top)
+        return np.sort(candidates[inside])
@@ -0,0 +1,37 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import pandas as pd
+
+from plot_engine import PlotSpec, prepare_plot, render_plot
+from utilities import DATETIME_COLUMN, OffscreenCanvas, _build_calendar_features
+
+
+def _dataset(first: str, last: str) -> (pd.DataFrame, pd.DataFrame):
+    """Return a dataset of one incident a day from the first to the last day and its
+    calendar features"""
+    index = pd.date_range(first, last, freq="D", name=DATETIME_COLUMN)
+    data = pd.DataFrame({DATETIME_COLUMN: index, "BORO": "BRONX"}, index=index)
+    return data, _build_calendar_features(index)
+
+
+def _tick_labels(spec: PlotSpec, data: pd.DataFrame, calendar: pd.DataFrame) -> list:
+    canvas = OffscreenCanvas()
+    render_plot(spec, prepare_plot(spec, data, calendar), canvas)
+    axis = canvas.axes.xaxis if spec.x is not None else canvas.axes.yaxis
+    return [label.get_text() for label in axis.get_ticklabels()]
+
+
+def test_bar_chart_of_a_date_range_names_its_months():
+    data, calendar = _dataset("2019-06-01", "2019-08-31")
+    for spec in (PlotSpec("bar", x=DATETIME_COLUMN, x_granularity="month"),
+                 PlotSpec("bar", y=DATETIME_COLUMN, y_granularity="month")):
+        assert _tick_labels(spec, data, calendar) == ["Jun", "Jul", "Aug"]
+
+
+def test_bar_chart_of_a_date_range_names_its_days():
+    # 2019-06-05 is a Wednesday
+    data, calendar = _dataset("2019-06-05", "2019-06-07")
+    spec = PlotSpec("bar", x=DATETIME_COLUMN, x_granularity="day")
+    assert _tick_labels(spec, data, calendar) == ["Wed", "Thurs", "Fri"]
@@ -0,0 +1,91 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utilities import (DATETIME_COLUMN, SNAPSHOT_MANIFEST, AggregationCache, _parse_dataset,
+                       _read_snapshot, _snapshot_directory, _write_snapshot)
+
+PERP_AGE_GROUPS = ["<18", "18-24", "25-44", "45-64", "65+", "UNKNOWN", "224", "940", "1020"]
+VIC_AGE_GROUPS = ["<18", "18-24", "25-44", "45-64", "65+", "UNKNOWN"]
+
+
+def _write_dataset(path, dates: list, times: list) -> None:
+    """Write a shooting CSV file of one incident for each date and time"""
+    rows = len(dates)
+    pd.DataFrame({
+        "INCIDENT_KEY": np.arange(rows),
+        "OCCUR_DATE": dates,
+        "OCCUR_TIME": times,
+        "BORO": "BRONX",
+        "PRECINCT": 40,
+        "JURISDICTION_CODE": 0,
+        "LOCATION_DESC": "",
+        "STATISTICAL_MURDER_FLAG": "false",
+        "PERP_AGE_GROUP": [PERP_AGE_GROUPS[row % len(PERP_AGE_GROUPS)] for row in range(rows)],
+        "PERP_SEX": "M",
+        "PERP_RACE": "BLACK",
+        "VIC_AGE_GROUP": [VIC_AGE_GROUPS[row % len(VIC_AGE_GROUPS)] for row in range(rows)],
+        "VIC_SEX": "M",
+        "VIC_RACE": "BLACK",
+        "X_COORD_CD": 1_000_000.0,
+        "Y_COORD_CD": 200_000.0,
+        "Latitude": 40.8,
+        "Longitude": -73.9,
+        "Lon_Lat": "POINT (-73.9 40.8)",
+    }).to_csv(path, index=False)
+
+
+def test_parse_dataset_with_a_final_chunk_without_a_time(tmp_path):
+    path = tmp_path / "NYPD_Shooting.csv"
+    dates = [f"01/{day:02d}/2019" for day in range(1, 11)]
+    _write_dataset(path, dates, ["12:00:00"] * 9 + [""])
+
+    # the last chunk holds only the incident without a time
+    data = _parse_dataset(str(path), chunksize=3)
+
+    timestamps = data[DATETIME_COLUMN]
+    assert len(data) == 10
+    assert timestamps.isna().sum() == 1
+    assert list(timestamps.dropna()) == [pd.Timestamp(f"2019-01-{day:02d} 12:00") for day in range(1, 10)]
+
+
+def test_parse_dataset_with_a_final_chunk_without_a_date(tmp_path):
+    path = tmp_path / "NYPD_Shooting.csv"
+    _write_dataset(path, ["01/01/2019"] * 9 + [""], ["12:00:00"] * 10)
+
+    data = _parse_dataset(str(path), chunksize=3)
+    assert data[DATETIME_COLUMN].isna().sum() == 1
+    assert data[DATETIME_COLUMN].notna().sum() == 9
+
+
+def test_read_snapshot_with_an_incomplete_manifest(tmp_path):
+    path = tmp_path / "NYPD_Shooting.csv"
+    _write_dataset(path, ["01/01/2019"] * 9, ["12:00:00"] * 9)
+    _write_snapshot(_parse_dataset(str(path)), str(path))
+    assert _read_snapshot(str(path)) is not None
+
+    manifest_path = os.path.join(_snapshot_directory(str(path)), SNAPSHOT_MANIFEST)
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+    del manifest["index"]
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file)
+
+    # the snapshot is discarded, the CSV file is parsed again
+    assert _read_snapshot(str(path)) is None
+
+
+def test_aggregation_cache_evicts_the_results_beyond_its_size_in_bytes():
+    cache = AggregationCache(maxsize=64, maxbytes=3 * 8000)
+    for key in range(4):
+        cache.get(key, lambda: np.zeros(1000))
+
+    # the least recently used result is evicted to keep 3 arrays of 8000 bytes
+    assert 0 not in cache and all(key in cache for key in (1, 2, 3))
+    assert cache.info().nbytes == 3 * 8000
+
+    # a result larger than the cache is computed but not stored
+    cache.get("large", lambda: pd.Series(np.zeros(4000)))
+    assert "large" not in cache and cache.info().currsize == 3
@@ -14,24 +14,41 @@ the application state
 
 """
 
-from typing import List
+import dataclasses
+import hashlib
+import json
+import os
+from collections import OrderedDict, namedtuple
+from typing import Callable, List, Optional
 
+import numpy as np
 import pandas as pd
 import seaborn as sns
 
-from PyQt5.QtWidgets import QMessageBox
+from PyQt5.QtWidgets import QMainWindow, QMessageBox, QStackedWidget
 from PyQt5.QtChart import QValueAxis, QDateTimeAxis, QBarCategoryAxis
 from PyQt5.QtGui import QCursor
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThread, QThreadPool, QPointF, QTimer, pyqtSignal
 
+import matplotlib as mpl
 import matplotlib.pyplot as plt
+from matplotlib.collections import PathCollection
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.patches import Patch
+from matplotlib.path import Path
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT
 
 import resources
+from kde import contour_levels, estimate_densities
 
 
-class CreateCanvas(FigureCanvasQTAgg):
+class ChartPlotter:
+    """The charts drawn on a matplotlib figure canvas.
+
+    This class is mixed with a canvas class, it creates the figure of the canvas and
+    plots the charts on its axes.
+    """
     def __init__(self, nrow=1, ncol=1):
         # create Matplotlib Figure object
         figure = Figure(dpi=100, tight_layout=True)
@@ -40,8 +57,98 @@ class CreateCanvas(FigureCanvasQTAgg):
         figure.subplots_adjust(wspace=.3, hspace=.4)
 
         # create the axes and set the number of rows/ columns for the subplots(s)
+        self.nrow, self.ncol = nrow, ncol
         self.axes = figure.subplots(nrow, ncol)
-        super(CreateCanvas, self).__init__(figure)
+        super(ChartPlotter, self).__init__(figure)
+
+        # the bars of the last bar chart and the settings they were drawn with, they are
+        # resized in place when the next bar chart only differs by its values
+        self.bars = None
+        self.bars_key = None
+        self.restyle_pending = False
+
+        # the points of the scatter chart on display and the chart rendered without them,
+        # used to redraw only the points when their transparency changes
+        self.scatter_collection = None
+        self.scatter_background = None
+        self.mpl_connect("draw_event", self.forget_scatter_background)
+
+        # the points of the rasterised scatter chart, binned again whenever the view
+        # limits change
+        self.raster = None
+        self.raster_image = None
+        self.raster_rebin_pending = False
+
+        # the regions of the map chart on display with their colour bar, recoloured in
+        # place when the next map chart is of the same regions
+        self.regions = None
+        self.regions_paths = None
+        self.regions_colorbar = None
+
+        # the spec and filter state of the chart on display, set by whoever draws the
+        # chart so that it is not drawn again
+        self.plot_key = None
+
+    def clear(self):
+        """Clear the figure for a new chart, rebuilding the axes if the theme changed"""
+        figure = self.figure
+        if self.restyle_pending:
+            # the axes take their colours from the theme when they are created
+            figure.clear()
+            figure.set_facecolor(mpl.rcParams["figure.facecolor"])
+            figure.set_edgecolor(mpl.rcParams["figure.edgecolor"])
+            self.axes = figure.subplots(self.nrow, self.ncol)
+            self.restyle_pending = False
+        else:
+            axes = list(np.ravel(self.axes))
+            for extra_axes in figure.axes:
+                # colour bars and other axes added by the previous chart
+                if extra_axes not in axes:
+                    extra_axes.remove()
+            for subplot in axes:
+                subplot.clear()
+
+        self.bars = None
+        self.bars_key = None
+        self.scatter_collection = None
+        self.scatter_background = None
+        self.raster = None
+        self.raster_image = None
+        self.regions = None
+        self.regions_paths = None
+        self.regions_colorbar = None
+        self.plot_key = None
+
+    def forget_scatter_background(self, event=None):
+        """The chart was redrawn, its background without the points may have changed"""
+        self.scatter_background = None
+
+    def set_scatter_alpha(self, alpha) -> bool:
+        """Change the transparency of the points of the scatter chart on display by
+        blitting them over the cached rest of the chart.
+
+        Returns False if there is no scatter chart to update.
+        """
+        if self.scatter_collection is None:
+            return False
+
+        if self.scatter_background is None:
+            # render the chart once without its points and keep it as background
+            self.scatter_collection.set_visible(False)
+            self.draw()
+            self.scatter_background = self.copy_from_bbox(self.axes.bbox)
+            self.scatter_collection.set_visible(True)
+
+        self.scatter_collection.set_alpha(alpha)
+        self.restore_region(self.scatter_background)
+        self.axes.draw_artist(self.scatter_collection)
+
+        # the legend is drawn above the points
+        legend = self.axes.get_legend()
+        if legend is not None:
+            self.axes.draw_artist(legend)
+        self.blit(self.axes.bbox)
+        return True
 
     def plot_bar_chart(self, orientation, labels: List[str], values: List[int],
                        axis_label=None, grid_on=False, grid_axis=None,
@@ -70,8 +177,24 @@ class CreateCanvas(FigureCanvasQTAgg):
         """
         labels = [f"{ind}" for ind in labels]
 
+        key = (orientation, tuple(labels), axis_label, grid_on, grid_axis,
+               tuple(tick_labels) if tick_labels else None)
+        if self.bars is not None and key == self.bars_key and not self.restyle_pending:
+            # the same bars are displayed, only update their size
+            for bar, value in zip(self.bars, values):
+                if orientation == "Vertical":
+                    bar.set_height(value)
+                else:
+                    bar.set_width(value)
+            self.axes.relim()
+            self.axes.autoscale_view()
+            return
+
+        self.clear()
+        self.bars_key = key
+
         if orientation == "Vertical":
-            self.axes.bar(labels, values, zorder=10)
+            self.bars = self.axes.bar(labels, values, zorder=10)
 
             if axis_label:
                 self.axes.set_xlabel(axis_label)
@@ -81,7 +204,7 @@ class CreateCanvas(FigureCanvasQTAgg):
                 self.axes.set_xticklabels(tick_labels)
 
         elif orientation == "Horizontal":
-            self.axes.barh(labels, values, zorder=10)
+            self.bars = self.axes.barh(labels, values, zorder=10)
 
             if axis_label:
                 self.axes.set_ylabel(axis_label)
@@ -95,7 +218,8 @@ class CreateCanvas(FigureCanvasQTAgg):
 
     def plot_scatter_chart(self, xaxis: List[int], yaxis: List[int], x_label: str,
                            y_label: str, x_tick_labels: bool = False, y_tick_labels: bool = False,
-                           fill: bool = False, alpha=1.0, hue=None, data: pd.DataFrame = None):
+                           fill: bool = False, alpha=1.0, hue=None, data: pd.DataFrame = None,
+                           rasterise: bool = False):
         """Plot a scatter chart on the created figure
 
         Parameter:
@@ -106,6 +230,9 @@ class CreateCanvas(FigureCanvasQTAgg):
             The title to used in both x and y axis
         x_tick_labels, y_tick_labels: bool
             if True, the default label would be used in place of the default tick label
+        rasterise: bool (default = False)
+            if True, the points are binned into a density image at the resolution of the
+            axes instead of being drawn one marker each
 
             see matplotlib documentation for more control
         """
@@ -114,12 +241,17 @@ class CreateCanvas(FigureCanvasQTAgg):
             if x_label == y_label:
                 sns.histplot(x=xaxis, y=yaxis, ax=self.axes)
             else:
-                sns.kdeplot(x=xaxis, y=yaxis, fill=fill, hue=hue, data=data, ax=self.axes)
+                groups = data[hue] if isinstance(hue, str) else hue
+                self.plot_density(xaxis, yaxis, groups)
+        elif rasterise:
+            groups = data[hue] if isinstance(hue, str) else hue
+            self.plot_raster_scatter(xaxis, yaxis, groups)
         else:
             if hue is None:
-                self.axes.scatter(xaxis, yaxis, alpha=alpha)
+                self.scatter_collection = self.axes.scatter(xaxis, yaxis, alpha=alpha)
             else:
                 sns.scatterplot(x=xaxis, y=yaxis, hue=hue, data=data, alpha=alpha, ax=self.axes)
+                self.scatter_collection = self.axes.collections[-1]
         self.axes.set_xlabel(x_label)
         self.axes.set_ylabel(y_label)
 
@@ -128,12 +260,309 @@ class CreateCanvas(FigureCanvasQTAgg):
         if y_tick_labels:
             self.axes.set_yticklabels(tick_labels)
 
+    def plot_raster_scatter(self, xaxis, yaxis, groups: pd.Series = None):
+        """Plot the points as an image of their density at the resolution of the axes.
+
+        If groups is given, the colour of each pixel blends the colours of the groups in
+        proportion of their points in the pixel. The image is binned again whenever the
+        view limits change, so zooming in reveals the detail of the points.
+        """
+        xaxis = np.asarray(xaxis, dtype=np.float64)
+        yaxis = np.asarray(yaxis, dtype=np.float64)
+
+        if groups is None:
+            codes, labels, colors = None, [], None
+        else:
+            codes, labels = pd.factorize(pd.Series(groups.array), sort=True)
+            colors = np.array(sns.color_palette(n_colors=max(len(labels), 1)))
+        self.raster = (xaxis, yaxis, codes, colors)
+
+        extent = (np.nanmin(xaxis), np.nanmax(xaxis), np.nanmin(yaxis), np.nanmax(yaxis))
+        self.raster_image = self.axes.imshow(np.zeros((1, 1, 4)), extent=extent, origin="lower",
+                                             aspect="auto", interpolation="nearest")
+        # the view limits are only changed by the user from now on
+        self.axes.set_autoscale_on(False)
+        self.rebin_raster()
+
+        self.axes.callbacks.connect("xlim_changed", self.schedule_raster_rebin)
+        self.axes.callbacks.connect("ylim_changed", self.schedule_raster_rebin)
+
+        if len(labels):
+            handles = [Patch(color=color, label=f"{label}") for label, color in zip(labels, colors)]
+            self.axes.legend(handles=handles, title=groups.name)
+
+    def schedule_raster_rebin(self, axes=None):
+        """Bin the raster again once the view limits are settled, both limits of the
+        view usually change together"""
+        if not self.raster_rebin_pending:
+            self.raster_rebin_pending = True
+            QTimer.singleShot(0, self.rebin_raster)
+
+    def rebin_raster(self):
+        """Bin the points of the rasterised scatter chart within the view limits"""
+        self.raster_rebin_pending = False
+        if self.raster is None:
+            return
+
+        xaxis, yaxis, codes, colors = self.raster
+        x_limits, y_limits = self.axes.get_xlim(), self.axes.get_ylim()
+        extent = (*x_limits, *y_limits)
+        shape = (max(int(self.axes.bbox.height), 1), max(int(self.axes.bbox.width), 1))
+        counts = _bin_points(xaxis, yaxis, extent, shape, codes,
+                             1 if colors is None else len(colors))
+
+        total = counts.sum(axis=0)
+        # log scaled opacity so that sparse pixels remain visible next to the dense ones
+        opacity = np.log1p(total) / max(np.log1p(total.max()), 1)
+
+        image = np.zeros((*shape, 4))
+        if colors is None:
+            image[..., :3] = mpl.colors.to_rgb(mpl.rcParams["axes.prop_cycle"].by_key()["color"][0])
+        else:
+            # blend the colour of every group by its share of the pixel points
+            with np.errstate(invalid="ignore", divide="ignore"):
+                shares = counts / total
+            image[..., :3] = np.nan_to_num(np.einsum("ghw,gc->hwc", shares, colors))
+        image[..., 3] = opacity
+
+        self.raster_image.set_data(image)
+        self.raster_image.set_extent(extent)
+        self.draw_idle()
+
+    def plot_density(self, xaxis=None, yaxis=None, groups: pd.Series = None, estimates=None):
+        """Plot the shaded kernel density estimate of the values on the created figure
+
+        Parameter:
+        xaxis, yaxis: optional
+            The values along the x and y axis respectively, the density of both is
+            plotted as filled contours, the density of either is plotted as a curve
+            along its axis
+        groups: pd.Series, optional
+            The group of each value, a density is plotted for each group with the
+            densities scaled by the share of each group
+        estimates: list, optional
+            The densities already estimated from the values by kde.estimate_densities,
+            they are estimated here otherwise
+        """
+        if estimates is None:
+            values = [np.asarray(axis, dtype=np.float64) for axis in (xaxis, yaxis) if axis is not None]
+            estimates = estimate_densities(values, groups)
+        colors = sns.color_palette(n_colors=max(len(estimates), 1))
+
+        if xaxis is not None and yaxis is not None:
+            # the same levels for every group, so that the shades compare across groups
+            proportions = np.linspace(.05, 1, 10)
+            densities = np.concatenate([density.ravel() for _, _, density in estimates] or [[0]])
+            levels = np.unique([*contour_levels(densities, proportions), densities.max()])
+            for (group, grids, density), color in zip(estimates, colors):
+                self.axes.contourf(*grids, density.T, levels=levels,
+                                   cmap=sns.light_palette(color, as_cmap=True))
+        else:
+            for (group, grids, density), color in zip(estimates, colors):
+                if xaxis is not None:
+                    self.axes.fill_between(grids[0], density, facecolor=(*color, .25),
+                                           edgecolor=color)
+                else:
+                    self.axes.fill_betweenx(grids[0], density, facecolor=(*color, .25),
+                                            edgecolor=color)
+            if xaxis is not None:
+                self.axes.set_ylabel("Density")
+            else:
+                self.axes.set_xlabel("Density")
+
+        if groups is not None and estimates:
+            handles = [Patch(facecolor=(*color, .25), edgecolor=color, label=f"{group}")
+                       for (group, _, _), color in zip(estimates, colors)]
+            self.axes.legend(handles=handles, title=groups.name)
+
+    def plot_grouped_bar_chart(self, orientation, crosstab: pd.DataFrame, axis_label=None,
+                               grid_on=False, grid_axis=None, stacked=False):
+        """Plots the bars of each group side by side, or stacked, on the created figure
+
+        Parameter:
+        orientation: str (Vertical | Horizontal)
+            The axis on which to plot the bar
+        crosstab: pd.DataFrame
+            The counts to plot, one row for each bar label and one column for each
+            group. The name of the columns is used as the legend title
+        axis_label: optional
+            The name of axis been plotted on as decided by the orientation
+        grid_on: bool (default = False)
+            if True, the grid line will be displayed.
+        grid_axis: optional
+            The axis on which the grid line will be display.
+        stacked: bool (default = False)
+            if True, the bars of the groups are stacked on one another
+        """
+        self.clear()
+
+        labels = [f"{ind}" for ind in crosstab.index]
+        positions = np.arange(len(labels))
+        groups = crosstab.columns
+        colors = sns.color_palette(n_colors=max(len(groups), 1))
+        counts = crosstab.to_numpy()
+
+        if stacked:
+            width = 0.8
+            offsets = np.zeros(len(groups))
+            bottoms = np.cumsum(counts, axis=1) - counts
+        else:
+            width = 0.8 / max(len(groups), 1)
+            offsets = (np.arange(len(groups)) - (len(groups) - 1) / 2) * width
+            bottoms = np.zeros_like(counts)
+
+        for number, (group, color) in enumerate(zip(groups, colors)):
+            if orientation == "Vertical":
+                self.axes.bar(positions + offsets[number], counts[:, number], width,
+                              bottom=bottoms[:, number], color=color, label=f"{group}", zorder=10)
+            elif orientation == "Horizontal":
+                self.axes.barh(positions + offsets[number], counts[:, number], width,
+                               left=bottoms[:, number], color=color, label=f"{group}", zorder=10)
+
+        if orientation == "Vertical":
+            self.axes.set_xticks(positions)
+            self.axes.set_xticklabels(labels)
+            if axis_label:
+                self.axes.set_xlabel(axis_label)
+            self.axes.set_ylabel("Count")
+        elif orientation == "Horizontal":
+            self.axes.set_yticks(positions)
+            self.axes.set_yticklabels(labels)
+            if axis_label:
+                self.axes.set_ylabel(axis_label)
+            self.axes.set_xlabel("Count")
+
+        # keep the legend above the bars
+        self.axes.legend(title=groups.name).set_zorder(20)
+        if grid_on and grid_axis:
+            self.axes.grid(grid_on, axis=grid_axis)
+
+    def plot_choropleth(self, paths: List[Path], values, label: str = None):
+        """Plots the regions of a map coloured by their values on the created figure
+
+        Parameter:
+        paths: list[Path]
+            The boundaries of the regions, projected so that the map is drawn with an
+            equal aspect. The regions are drawn once and only recoloured by the next
+            calls with the same list of paths
+        values: array like
+            The value of each region, the regions without a value (nan) are drawn in
+            the colour of missing values
+        label: optional
+            The name of the values, written along the colour bar
+        """
+        values = np.ma.masked_invalid(np.asarray(values, dtype=np.float64))
+        limits = (values.min(), values.max()) if values.count() else (0, 1)
+
+        if self.regions is not None and paths is self.regions_paths and not self.restyle_pending:
+            # the same regions are displayed, only update their colours
+            self.regions.set_array(values)
+            self.regions.set_clim(*limits)
+            self.regions_colorbar.update_normal(self.regions)
+            self.regions_colorbar.set_label(label)
+            return
+
+        self.clear()
+        self.regions_paths = paths
+        self.regions = PathCollection(paths, edgecolors=mpl.rcParams["axes.edgecolor"],
+                                      linewidths=.3)
+        self.regions.set_array(values)
+        self.regions.set_clim(*limits)
+        self.axes.add_collection(self.regions)
+
+        self.axes.autoscale_view()
+        self.axes.set_aspect("equal")
+        self.axes.set_axis_off()
+        self.regions_colorbar = self.figure.colorbar(self.regions, ax=self.axes, label=label)
+
     def rotate_ticks(self):
         """Rotate the labels of the x axis by 90 deg"""
         labels = self.axes.get_xticklabels()
         plt.setp(labels, rotation=90)
 
 
+class CreateCanvas(ChartPlotter, FigureCanvasQTAgg):
+    """The canvas displaying the charts in the window"""
+
+
+class OffscreenCanvas(ChartPlotter, FigureCanvasAgg):
+    """The canvas rendering the charts to image files, without a display"""
+
+
+class CanvasManager:
+    """Own the matplotlib canvas and navigation toolbar of a window.
+
+    The canvas and its toolbar are created once and every matplotlib chart is drawn on
+    the same figure, the canvas is displayed by switching the page of the central stack
+    of the window instead of replacing its central widget.
+    """
+    def __init__(self, window: QMainWindow, stack: QStackedWidget):
+        self.window = window
+        self.stack = stack
+
+        self.canvas = CreateCanvas()
+        self.stack.addWidget(self.canvas)
+
+        self.tool_bar = NavigationToolbar2QT(self.canvas, window)
+        self.window.addToolBar(self.tool_bar)
+        self.tool_bar.setVisible(False)
+
+    def get_canvas(self, clear=True) -> CreateCanvas:
+        """Return the canvas, cleared for a new chart if clear is True"""
+        if clear:
+            self.canvas.clear()
+        return self.canvas
+
+    def restyle(self):
+        """Rebuild the axes before the next chart so that it uses the current theme"""
+        self.canvas.restyle_pending = True
+
+    def show(self):
+        """Display the canvas and its toolbar and redraw the chart"""
+        # forget the zoom and pan history of the previous chart
+        self.tool_bar.update()
+        self.tool_bar.setVisible(True)
+        self.stack.setCurrentWidget(self.canvas)
+        self.canvas.draw_idle()
+
+    def hide(self):
+        """Hide the toolbar, the window is about to display another page"""
+        self.tool_bar.setVisible(False)
+
+
+def _bin_points(xaxis: np.ndarray, yaxis: np.ndarray, extent, shape, codes: np.ndarray = None,
+                ncodes: int = 1) -> np.ndarray:
+    """Count the points falling in each cell of a regular grid
+
+    Parameter:
+    xaxis, yaxis: np.ndarray
+        The coordinates of the points
+    extent: tuple (left, right, bottom, top)
+        The area covered by the grid
+    shape: tuple (rows, columns)
+        The number of cells of the grid along the y and x axis
+    codes: np.ndarray, optional
+        The group of each point, as integers from 0 to ncodes - 1 (-1 is ignored)
+
+    Returns the counts as an array of shape (ncodes, rows, columns), the first row of
+    cells being at the bottom of the area.
+    """
+    left, right, bottom, top = extent
+    rows, columns = shape
+    with np.errstate(invalid="ignore"):
+        column = np.floor((xaxis - left) * (columns / (right - left)))
+        row = np.floor((yaxis - bottom) * (rows / (top - bottom)))
+        inside = (column >= 0) & (column < columns) & (row >= 0) & (row < rows)
+
+    cells = row[inside].astype(np.int64) * columns + column[inside].astype(np.int64)
+    if codes is not None:
+        codes = np.asarray(codes)[inside]
+        cells = np.where(codes >= 0, codes * (rows * columns) + cells, -1)
+        cells = cells[cells >= 0]
+    counts = np.bincount(cells, minlength=ncodes * rows * columns)
+    return counts.reshape(ncodes, rows, columns)
+
+
 def reorder_series(axis_label, series):
     """Set the order of the features that has intrinsic ordering"""
     if axis_label == 'JURISDICTION' or axis_label == "PERP_AGE_GROUP" or axis_label == "VIC_AGE_GROUP":
@@ -174,6 +603,81 @@ def _change_axis(axis_label, values, axe="x") -> QValueAxis or QBarCategoryAxis
     return axis
 
 
+def _build_point_buffer(xaxis, yaxis) -> List[QPointF]:
+    """Build the points of a QXYSeries from the values of both axis in one pass"""
+    xaxis = np.asarray(xaxis, dtype=np.float64).tolist()
+    yaxis = np.asarray(yaxis, dtype=np.float64).tolist()
+    return list(map(QPointF, xaxis, yaxis))
+
+
+def _sort_points(xaxis, yaxis) -> (np.ndarray, np.ndarray):
+    """Return the points of both axis as float arrays sorted along the x axis, without
+    the points missing a coordinate"""
+    xaxis = np.asarray(xaxis, dtype=np.float64)
+    yaxis = np.asarray(yaxis, dtype=np.float64)
+    # a missing x would sort last and stretch the x range of the downsampling to nan
+    finite = np.isfinite(xaxis) & np.isfinite(yaxis)
+    if not finite.all():
+        xaxis, yaxis = xaxis[finite], yaxis[finite]
+    order = np.argsort(xaxis, kind="stable")
+    return xaxis[order], yaxis[order]
+
+
+def _downsample_min_max(xaxis: np.ndarray, yaxis: np.ndarray, width: int) -> (np.ndarray, np.ndarray):
+    """Reduce points sorted along the x axis to at most four points per pixel column.
+
+    The x range is split into width columns, and only the first, last, lowest and
+    highest point of each column are kept, which draws the same line at that width.
+    """
+    if len(xaxis) <= 4 * width or xaxis[-1] == xaxis[0]:
+        return xaxis, yaxis
+
+    columns = ((xaxis - xaxis[0]) / (xaxis[-1] - xaxis[0]) * width).astype(np.int64)
+    columns = np.minimum(columns, width - 1)
+
+    # the points are sorted by x so each column is a contiguous run of points
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    ends = np.r_[starts[1:], len(xaxis)] - 1
+
+    # order every column by y to find its lowest and highest point
+    by_height = np.lexsort((yaxis, columns))
+    keep = np.unique(np.concatenate([starts, ends, by_height[starts], by_height[ends]]))
+    return xaxis[keep], yaxis[keep]
+
+
+# the statistics the line chart can aggregate the values of a time bucket with
+LINE_AGGREGATIONS = {
+    "Count": "size", "Mean": "mean", "Median": "median", "25th percentile": 0.25,
+    "75th percentile": 0.75, "90th percentile": 0.9
+}
+
+
+def _aggregate_by_bucket(buckets: pd.Series, values: pd.Series, aggregation: str) -> pd.Series:
+    """Aggregate the values falling in each time bucket
+
+    Parameter:
+    buckets: pd.Series
+        The time bucket (day, month, year...) of each value
+    values: pd.Series
+        The values to aggregate, ignored by the Count aggregation
+    aggregation: str
+        One of the LINE_AGGREGATIONS
+
+    Returns the aggregated values indexed by the sorted buckets.
+    """
+    how = LINE_AGGREGATIONS[aggregation]
+    grouped = pd.Series(np.asarray(values, dtype=np.float64)).groupby(np.asarray(buckets))
+
+    if isinstance(how, float):
+        aggregated = grouped.quantile(how)
+    else:
+        aggregated = getattr(grouped, how)()
+
+    aggregated.index.name = buckets.name
+    aggregated.name = "Count" if how == "size" else f"{aggregation} of {values.name}"
+    return aggregated.sort_index()
+
+
 def _change_cursor(status="on") -> QCursor:
     """Change the cursor shape of the application to indicate it busy state"""
     cursor = QCursor()
@@ -184,30 +688,456 @@ def _change_cursor(status="on") -> QCursor:
     return cursor
 
 
-def _load_dataset_from_memory() -> pd.DataFrame:
-    data = pd.read_csv("../Dataset/NYPD_Shooting.csv", parse_dates=[["OCCUR_DATE", "OCCUR_TIME"]])
+DATASET_PATH = "../Dataset/NYPD_Shooting.csv"
+
+# bump the version whenever the layout of the snapshot or the typing done by
+# _parse_dataset changes, so that stale snapshots are rebuilt from the CSV
+SNAPSHOT_VERSION = 4
+SNAPSHOT_MANIFEST = "manifest.json"
+
+
+# number of rows parsed at once by the streaming reader, this bounds the memory taken by
+# the untyped strings of a chunk on top of the typed column buffers
+CHUNKSIZE = 100_000
+
+# the type of every column of the shooting CSV file, so that pandas does not have to
+# infer them. The text columns are read as categories, which also makes the dates and
+# times cheap to parse since each distinct value is parsed only once
+SHOOTING_CSV_SCHEMA = {
+    "INCIDENT_KEY": "int64",
+    "OCCUR_DATE": "category",
+    "OCCUR_TIME": "category",
+    "BORO": "category",
+    "PRECINCT": "int16",
+    "JURISDICTION_CODE": "Int8",
+    "LOCATION_DESC": "category",
+    "STATISTICAL_MURDER_FLAG": "bool",
+    "PERP_AGE_GROUP": "category",
+    "PERP_SEX": "category",
+    "PERP_RACE": "category",
+    "VIC_AGE_GROUP": "category",
+    "VIC_SEX": "category",
+    "VIC_RACE": "category",
+    "X_COORD_CD": "float64",
+    "Y_COORD_CD": "float64",
+    "Latitude": "float32",
+    "Longitude": "float32",
+    "Lon_Lat": "object",
+}
+DATE_FORMAT = "%m/%d/%Y"
+
+DATETIME_COLUMN = "OCCUR_DATE_OCCUR_TIME"
+REDUNDANT_COLUMNS = ["Lon_Lat", "X_COORD_CD", "Y_COORD_CD", "INCIDENT_KEY"]
+CATEGORICAL_COLUMNS = [
+    'BORO', 'PRECINCT', 'JURISDICTION_CODE', 'LOCATION_DESC', 'PERP_AGE_GROUP',
+    'PERP_SEX', 'PERP_RACE', 'VIC_AGE_GROUP', 'VIC_SEX', 'VIC_RACE'
+]
+# the calendar features of the incidents missing their date or time
+CALENDAR_MISSING = -1
+
+
+def _count_rows(path: str) -> int:
+    """Return the number of data rows of a CSV file without parsing it"""
+    lines, last = 0, b"\n"
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+
+    # count the last line if it is not terminated and ignore the header line
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
 
-    # optimizing tables and remove redundant columns
-    data = data.drop(["Lon_Lat", "X_COORD_CD", "Y_COORD_CD", "INCIDENT_KEY"], axis=1)
+class _CategoryEncoder:
+    """Encode the values of a column chunk by chunk against a growing dictionary"""
+    def __init__(self):
+        self.dictionary = {}
 
-    categorical_columns = [
-        'BORO', 'PRECINCT', 'JURISDICTION_CODE', 'LOCATION_DESC', 'PERP_AGE_GROUP',
-        'PERP_SEX', 'PERP_RACE', 'VIC_AGE_GROUP', 'VIC_SEX', 'VIC_RACE'
-    ]
+    def encode(self, values: pd.Series) -> np.ndarray:
+        codes, uniques = pd.factorize(values)
+        lookup = np.array([self.dictionary.setdefault(value, len(self.dictionary))
+                           for value in uniques], dtype=np.int32)
+        return np.where(codes >= 0, lookup[codes] if len(lookup) else codes, -1)
 
-    data[categorical_columns] = data[categorical_columns].astype('category')
-    data = data.set_index("OCCUR_DATE_OCCUR_TIME", drop=False)
+    def to_categorical(self, codes: np.ndarray) -> pd.Categorical:
+        """Build the categorical column with sorted categories as astype('category') would"""
+        categories = pd.Index(list(self.dictionary))
+        order = categories.argsort()
+
+        remap = np.empty(len(order) + 1, dtype=np.int32)
+        remap[order] = np.arange(len(order))
+        # missing values (-1) land on the extra last slot
+        remap[-1] = -1
+        return pd.Categorical.from_codes(remap[codes], categories[order])
+
+
+def _combine_date_time(dates: pd.Series, times: pd.Series) -> np.ndarray:
+    """Combine the MM/DD/YYYY dates and HH:MM:SS times into int64 nanosecond timestamps.
+
+    Only the distinct dates and times are parsed, with a fixed format, the timestamps of
+    the rows are then gathered from them through the category codes.
+    """
+    dates, times = dates.astype("category"), times.astype("category")
+    days = pd.to_datetime(dates.cat.categories, format=DATE_FORMAT)
+    days = days.to_numpy(dtype="datetime64[ns]").view("int64")
+    seconds = pd.to_timedelta(times.cat.categories).to_numpy(dtype="timedelta64[ns]").view("int64")
+
+    # the missing values have the code -1, which gathers a placeholder appended to the
+    # parsed values, a chunk may have no date or no time at all
+    days, seconds = np.append(days, 0), np.append(seconds, 0)
+    date_codes, time_codes = dates.cat.codes.to_numpy(), times.cat.codes.to_numpy()
+    timestamps = days[date_codes] + seconds[time_codes]
+
+    # rows missing their date or time are not a time
+    timestamps[(date_codes < 0) | (time_codes < 0)] = np.iinfo(np.int64).min
+    return timestamps
+
+
+def _build_frame(columns: dict, index_name: Optional[str]) -> pd.DataFrame:
+    """Build a data frame on the given column arrays without copying them"""
+    # set_index and the consolidation of same-typed columns would both copy the arrays
+    index = None
+    if index_name is not None:
+        index = pd.DatetimeIndex(columns[index_name], name=index_name, copy=False)
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def _parse_dataset(path: str, chunksize: int = CHUNKSIZE,
+                   progress: Callable[[int, str], None] = None) -> pd.DataFrame:
+    """Parse the shooting CSV file and return the typed data frame used by the program.
+
+    The file is streamed in chunks of rows read with SHOOTING_CSV_SCHEMA, whose values are
+    typed straight into column buffers preallocated for the whole file, the categorical
+    columns being encoded against a dictionary growing with each chunk. The peak memory
+    is therefore the size of the final frame plus about one chunk of parsed rows, the
+    chunks being read by pandas with their own overhead.
+
+    The incidents are sorted by their time of occurrence, the index of the frame is
+    monotonic increasing. The columns of the file missing from the schema are ignored,
+    a ValueError is raised if a column of the schema is missing from the file.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    # the columns added to newer exports of the dataset are not read
+    required = [column for column in SHOOTING_CSV_SCHEMA if column not in REDUNDANT_COLUMNS]
+    missing = [column for column in required if column not in header]
+    if missing:
+        raise ValueError(f"{path} is missing the columns {', '.join(missing)}")
+    usecols = [column for column in header if column in required]
+    dtype = {column: SHOOTING_CSV_SCHEMA[column] for column in usecols}
+
+    total = _count_rows(path)
+    encoders = {column: _CategoryEncoder() for column in CATEGORICAL_COLUMNS}
+    buffers = {DATETIME_COLUMN: np.empty(total, dtype=np.int64)}
+    for column in usecols:
+        if column in CATEGORICAL_COLUMNS:
+            buffers[column] = np.empty(total, dtype=np.int32)
+        elif column not in ["OCCUR_DATE", "OCCUR_TIME"]:
+            buffers[column] = np.empty(total, dtype=dtype[column])
+
+    rows = 0
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        end = rows + len(chunk)
+        if end > total:
+            # the row count was underestimated, grow the buffers
+            total = max(end, 2 * total)
+            buffers = {column: np.resize(values, total) for column, values in buffers.items()}
+
+        buffers[DATETIME_COLUMN][rows:end] = _combine_date_time(chunk["OCCUR_DATE"],
+                                                                chunk["OCCUR_TIME"])
+
+        for column, values in chunk.items():
+            if column in CATEGORICAL_COLUMNS:
+                buffers[column][rows:end] = encoders[column].encode(values)
+            elif column in buffers:
+                buffers[column][rows:end] = values.to_numpy()
+
+        rows = end
+        if progress is not None and total:
+            progress(10 + 80 * rows // total, "Parsing dataset")
+
+    # sort the incidents by their time of occurrence, keeping the order of the file for
+    # the incidents of the same time, so that a date range is a slice of the frame. NaT
+    # is the smallest int64, the incidents without a time come first
+    timestamps = buffers.pop(DATETIME_COLUMN)[:rows]
+    order = None
+    if (timestamps[1:] < timestamps[:-1]).any():
+        order = np.argsort(timestamps, kind="stable")
+        timestamps = timestamps[order]
+
+    columns = {DATETIME_COLUMN: timestamps.view("datetime64[ns]")}
+    for column, values in buffers.items():
+        values = values[:rows] if order is None else values[:rows][order]
+        if column in CATEGORICAL_COLUMNS:
+            values = encoders[column].to_categorical(values)
+        columns[column] = values
+    data = _build_frame(columns, DATETIME_COLUMN)
 
     # order the age group categories
     ordering = ['<18', '18-24', '25-44', '45-64', '65+', 'UNKNOWN', '224', '940', '1020']
-    data["PERP_AGE_GROUP"].cat.reorder_categories(ordering, ordered=True, inplace=True)
+    data["PERP_AGE_GROUP"] = data["PERP_AGE_GROUP"].cat.reorder_categories(ordering, ordered=True)
 
     ordering = ['<18', '18-24', '25-44', '45-64', '65+', 'UNKNOWN']
-    data["VIC_AGE_GROUP"].cat.reorder_categories(ordering, ordered=True, inplace=True)
+    data["VIC_AGE_GROUP"] = data["VIC_AGE_GROUP"].cat.reorder_categories(ordering, ordered=True)
 
     return data
 
 
+def _snapshot_directory(path: str) -> str:
+    """Return the directory holding the binary snapshot of the given CSV file"""
+    directory, filename = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, ".snapshot", os.path.splitext(filename)[0])
+
+
+def _file_digest(path: str) -> str:
+    """Return the blake2b digest of the content of a file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_atomically(destination: str, writer) -> None:
+    """Write a file through a temporary file so that readers never see a partial file"""
+    temporary = f"{destination}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as file:
+            writer(file)
+        os.replace(temporary, destination)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def _write_snapshot(data: pd.DataFrame, path: str) -> None:
+    """Store the typed data frame as one .npy file per column plus a manifest holding
+    the category dictionaries and the fingerprint of the CSV file it was built from.
+
+    Failing to write the snapshot is never fatal, the next start simply parses the
+    CSV file again.
+    """
+    directory = _snapshot_directory(path)
+    manifest_path = os.path.join(directory, SNAPSHOT_MANIFEST)
+    try:
+        stat = os.stat(path)
+        source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": _file_digest(path)}
+
+        os.makedirs(directory, exist_ok=True)
+        # invalidate the current snapshot before replacing its columns
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+        columns = []
+        for name in data.columns:
+            series = data[name]
+            column = {"name": name}
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                values = series.cat.codes.to_numpy()
+                column.update(kind="category", ordered=bool(series.cat.ordered),
+                              categories=series.cat.categories.tolist(),
+                              categories_dtype=str(series.cat.categories.dtype))
+            elif np.issubdtype(series.dtype, np.datetime64):
+                values = series.to_numpy().view("int64")
+                column.update(kind="datetime", dtype=str(series.dtype))
+            else:
+                values = series.to_numpy()
+                column.update(kind="array")
+
+            column["file"] = f"{name}.npy"
+            _save_atomically(os.path.join(directory, column["file"]),
+                             lambda file: np.save(file, values, allow_pickle=False))
+            columns.append(column)
+
+        manifest = {
+            "version": SNAPSHOT_VERSION, "source": source, "index": data.index.name,
+            "columns": columns
+        }
+        _save_atomically(manifest_path, lambda file: file.write(json.dumps(manifest).encode()))
+    except OSError:
+        pass
+
+
+def _read_snapshot(path: str, memory_map: bool = False) -> Optional[pd.DataFrame]:
+    """Load the typed data frame from its snapshot.
+
+    Returns None if there is no snapshot or it was not built from the current content
+    of the CSV file. A CSV file that was only touched (same size, different modification
+    time) is checked by content digest before its snapshot is discarded.
+
+    If memory_map is True, the columns are memory-mapped read-only instead of read into
+    memory and the frame is built without copying them, so every process loading the
+    same snapshot shares the same physical pages.
+    """
+    directory = _snapshot_directory(path)
+    manifest_path = os.path.join(directory, SNAPSHOT_MANIFEST)
+    try:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        return None
+
+    source = manifest.get("source", {})
+    if manifest.get("version") != SNAPSHOT_VERSION or source.get("size") != stat.st_size:
+        return None
+
+    if source.get("mtime_ns") != stat.st_mtime_ns:
+        if source.get("digest") != _file_digest(path):
+            return None
+
+        # same content, remember the new modification time to skip the digest next time
+        source["mtime_ns"] = stat.st_mtime_ns
+        try:
+            _save_atomically(manifest_path, lambda file: file.write(json.dumps(manifest).encode()))
+        except OSError:
+            pass
+
+    mmap_mode = "r" if memory_map else None
+    columns = {}
+    try:
+        for column in manifest["columns"]:
+            values = np.load(os.path.join(directory, column["file"]), mmap_mode=mmap_mode,
+                             allow_pickle=False)
+            if column["kind"] == "category":
+                categories = pd.Index(column["categories"], dtype=column["categories_dtype"])
+                values = pd.Categorical.from_codes(values, categories, ordered=column["ordered"])
+            elif column["kind"] == "datetime":
+                values = values.view(column["dtype"])
+            columns[column["name"]] = values
+        data = _build_frame(columns, manifest["index"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+    # the date ranges are found by binary search in the sorted index, the incidents
+    # without a time (NaT, the smallest int64) come first
+    timestamps = data.index.asi8
+    if (timestamps[1:] < timestamps[:-1]).any():
+        return None
+    return data
+
+
+def _load_dataset_from_memory(path: str = DATASET_PATH, use_snapshot: bool = True,
+                              memory_map: bool = False,
+                              progress: Callable[[int, str], None] = None) -> pd.DataFrame:
+    """Load the shooting dataset.
+
+    The typed data frame is read from its binary snapshot when the snapshot matches the
+    CSV file, otherwise the CSV file is parsed and a fresh snapshot is written for the
+    next start.
+
+    Parameter:
+    path: str
+        The path of the shooting CSV file
+    use_snapshot: bool (default = True)
+        if False, the CSV file is always parsed and no snapshot is written
+    memory_map: bool (default = False)
+        if True, the frame is backed by the memory-mapped snapshot columns (integer
+        category codes, int64 timestamps, float32 coordinates), so the resident memory
+        of the data is shared by every process using the same snapshot. The frame is
+        read-only in that mode.
+    progress: callable, optional
+        Called with the percentage done and a short description of the current step
+    """
+    if progress is None:
+        progress = lambda percent, message: None
+
+    if use_snapshot:
+        progress(0, "Reading snapshot")
+        data = _read_snapshot(path, memory_map)
+        if data is not None:
+            progress(100, "Dataset loaded")
+            return data
+
+    progress(10, "Parsing dataset")
+    data = _parse_dataset(path, progress=progress)
+
+    if use_snapshot:
+        progress(90, "Writing snapshot")
+        _write_snapshot(data, path)
+        if memory_map:
+            # hand out the shared pages rather than the private parsed copy
+            mapped = _read_snapshot(path, memory_map)
+            if mapped is not None:
+                data = mapped
+
+    progress(100, "Dataset loaded")
+    return data
+
+
+def _build_calendar_features(index: pd.DatetimeIndex) -> pd.DataFrame:
+    """Derive the calendar features of the incidents as compact integer columns.
+
+    The columns are the ISO day of the week (day, Monday is 1), the month, the year,
+    the hour, the ISO week and the quarter, indexed like the dataset. The features of
+    the incidents without a time (NaT) are CALENDAR_MISSING.
+    """
+    missing = index.isna()
+    # the features are derived from a placeholder time then replaced
+    dates = index.fillna(pd.Timestamp(0)) if missing.any() else index
+    features = {
+        "day": (dates.dayofweek + 1).to_numpy(dtype=np.int8),
+        "month": dates.month.to_numpy(dtype=np.int8),
+        "year": dates.year.to_numpy(dtype=np.int16),
+        "hour": dates.hour.to_numpy(dtype=np.int8),
+        "week": dates.isocalendar().week.to_numpy(dtype=np.int8),
+        "quarter": dates.quarter.to_numpy(dtype=np.int8),
+    }
+    if missing.any():
+        for values in features.values():
+            values[missing] = CALENDAR_MISSING
+    return pd.DataFrame(features, index=index)
+
+
+def _date_slice(index: pd.DatetimeIndex, first, last) -> slice:
+    """Return the positions of the incidents from the first to the last day, both
+    included, as a slice of the sorted index found by binary search. The incidents
+    without a time, at the start of the index, are never in the slice."""
+    # the search runs on the int64 timestamps, where NaT is the smallest value as in
+    # the sorted index, numpy sorts NaT after every date
+    timestamps = index.asi8
+    start = np.searchsorted(timestamps, pd.Timestamp(first).value, "left")
+    stop = np.searchsorted(timestamps, (pd.Timestamp(last) + pd.Timedelta(days=1)).value, "left")
+    return slice(start, max(start, stop))
+
+
+def _category_codes(values: pd.Series, missing=None):
+    """Return the code of every value and the values the codes stand for, the categories
+    of categorical columns, the sorted distinct values otherwise. Missing values have
+    the code -1, as have the values equal to missing, e.g. CALENDAR_MISSING for the
+    calendar features."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    codes, labels = pd.factorize(values.array, sort=True)
+    if missing is not None:
+        found = np.flatnonzero(np.asarray(labels) == missing)
+        if len(found):
+            # the codes of the following values move down to fill the gap
+            codes = np.where(codes == found[0], -1, codes - (codes > found[0]))
+            labels = np.delete(np.asarray(labels), found[0])
+    return codes, labels
+
+
+def _count_crosstab(values: pd.Series, groups: pd.Series) -> pd.DataFrame:
+    """Count the incidents for each pair of value and group.
+
+    Returns a frame with one row for each value and one column for each group, the unused
+    categories of categorical columns included.
+    """
+    value_codes, value_labels = _category_codes(values)
+    group_codes, group_labels = _category_codes(groups)
+
+    # count every pair at once through a single code combining the value and the group
+    present = (value_codes >= 0) & (group_codes >= 0)
+    pairs = value_codes[present].astype(np.int64) * len(group_labels) + group_codes[present]
+    counts = np.bincount(pairs, minlength=len(value_labels) * len(group_labels))
+
+    return pd.DataFrame(counts.reshape(len(value_labels), len(group_labels)),
+                        index=pd.Index(value_labels, name=values.name),
+                        columns=pd.Index(group_labels, name=groups.name))
+
+
 def _display_bar_chart_warning(parent) -> bool:
     """Display the error argument for the bar chart"""
     message = "This feature data are continuous values and not categorical, do you still " \
@@ -217,6 +1147,247 @@ def _display_bar_chart_warning(parent) -> bool:
     return permission
 
 
+class DatasetLoader(QThread):
+    """Load the dataset on a worker thread, reporting the progress of the load.
+
+    The loaded data frame is delivered through the loaded signal, the error message
+    through the failed signal if the dataset could not be loaded.
+    """
+    progress = pyqtSignal(int, str)
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, memory_map=False, parent=None):
+        super(DatasetLoader, self).__init__(parent)
+        self.memory_map = memory_map
+
+    def run(self):
+        try:
+            data = _load_dataset_from_memory(memory_map=self.memory_map, progress=self.progress.emit)
+        except Exception as error:
+            # this is the thread boundary, an exception leaving run() would never reach
+            # the window and leave the splash screen on display
+            self.failed.emit(str(error))
+            return
+        self.loaded.emit(data)
+
+
+class PlotJobSignals(QObject):
+    """The signals of a plot job, a QRunnable cannot emit signals by itself"""
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+
+class PlotJob(QRunnable):
+    """Compute the data of a chart on a thread of the pool.
+
+    The result of compute() is delivered, with the generation of the job, through the
+    finished signal of the scheduler, the error message through its failed signal.
+    """
+    def __init__(self, scheduler, generation: int, compute: Callable):
+        super(PlotJob, self).__init__()
+        self.scheduler = scheduler
+        self.generation = generation
+        self.compute = compute
+        # the signals belong to the scheduler, the pool may delete a job cleared from its
+        # queue while it is starting
+        self.signals = scheduler.signals
+
+    def run(self):
+        # a newer job superseded this one while it was waiting for a thread
+        if self.generation != self.scheduler.generation:
+            return
+        try:
+            result = self.compute()
+        except Exception as error:
+            # an exception leaving run() is lost with the thread, the window would wait
+            # for the chart forever
+            self.signals.failed.emit(self.generation, str(error))
+            return
+        self.signals.finished.emit(self.generation, result)
+
+
+class PlotJobScheduler(QObject):
+    """Run the computations behind the charts away from the GUI thread.
+
+    Only the latest job is current, submitting a job or calling cancel supersedes the
+    jobs before it: the ones still waiting are removed from the pool and the results of
+    the ones already running are discarded when they finish. The callbacks of the
+    current job are called on the GUI thread.
+    """
+    def __init__(self, parent=None, max_threads=2):
+        super(PlotJobScheduler, self).__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.generation = 0
+        self.cancelled = 0
+        self._callbacks = {}
+        self.signals = PlotJobSignals(self)
+        self.signals.finished.connect(self._finish)
+        self.signals.failed.connect(self._fail)
+
+    def submit(self, compute: Callable, finished: Callable, failed: Callable = None) -> int:
+        """Run compute() on the pool and call finished with its result, or failed with
+        the error message, unless the job was superseded in the meantime"""
+        self.cancel()
+        job = PlotJob(self, self.generation, compute)
+        self._callbacks[self.generation] = (finished, failed)
+        self.pool.start(job)
+        return self.generation
+
+    def cancel(self):
+        """Supersede the current job, if any"""
+        if self._callbacks:
+            self.cancelled += len(self._callbacks)
+            self._callbacks.clear()
+            self.pool.clear()
+        self.generation += 1
+
+    def is_busy(self) -> bool:
+        return bool(self._callbacks)
+
+    def _finish(self, generation, result):
+        finished, _ = self._callbacks.pop(generation, (None, None))
+        if finished is not None:
+            finished(result)
+
+    def _fail(self, generation, message):
+        _, failed = self._callbacks.pop(generation, (None, None))
+        if failed is not None:
+            failed(message)
+
+
+# how long, in milliseconds, the settings must stay unchanged before the chart is redrawn
+REDRAW_DELAY = 60
+
+RedrawInfo = namedtuple("RedrawInfo", ["requests", "redraws", "suppressed"])
+
+
+class RedrawScheduler(QObject):
+    """Coalesce the redraw requests made in quick succession into a single redraw.
+
+    Every request restarts a short timer, the redraw happens once no request was made
+    for the delay, so that changing several settings at once only renders their final
+    state. The requests that did not lead to a redraw of their own are counted as
+    suppressed.
+
+    The redraw receives the argument of the last request, or the one chosen by
+    merge(pending argument, new argument) among the coalesced requests.
+    """
+    def __init__(self, redraw: Callable, delay=REDRAW_DELAY, merge: Callable = None, parent=None):
+        super(RedrawScheduler, self).__init__(parent)
+        self.redraw = redraw
+        self.merge = merge
+        self.requests = 0
+        self.redraws = 0
+        self.suppressed = 0
+        self._pending = False
+        self._argument = None
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+
+    def request(self, argument=None):
+        """Redraw with argument once the requests settle"""
+        self.requests += 1
+        if self._pending:
+            # the pending redraw serves this request as well
+            self.suppressed += 1
+            if self.merge is not None:
+                argument = self.merge(self._argument, argument)
+        self._pending = True
+        self._argument = argument
+        self.timer.start()
+
+    def flush(self):
+        """Redraw now if a redraw is pending"""
+        if not self._pending:
+            return
+        self.timer.stop()
+        self._pending = False
+        self.redraws += 1
+        self.redraw(self._argument)
+
+    def info(self) -> RedrawInfo:
+        return RedrawInfo(self.requests, self.redraws, self.suppressed)
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize", "nbytes", "maxbytes"])
+
+
+def _result_nbytes(result) -> int:
+    """Return the size in bytes of the arrays held by a result, searching the lists,
+    tuples, dictionaries and dataclasses it is made of"""
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(index=True).sum())
+    if isinstance(result, (pd.Series, pd.Index)):
+        return int(result.memory_usage())
+    if dataclasses.is_dataclass(result) and not isinstance(result, type):
+        return sum(_result_nbytes(getattr(result, field.name)) for field in dataclasses.fields(result))
+    if isinstance(result, (list, tuple)):
+        return sum(_result_nbytes(value) for value in result)
+    if isinstance(result, dict):
+        return sum(_result_nbytes(value) for value in result.values())
+    return 0
+
+
+class AggregationCache:
+    """A least recently used cache of the aggregations behind the charts.
+
+    The results are stored by a key describing the plot settings they were computed for,
+    the hits and misses are counted to measure the effect of the cache. The cache holds
+    at most maxsize results whose arrays add up to at most maxbytes, the charts of the
+    incidents keep arrays the size of the dataset. A result larger than maxbytes is not
+    stored.
+    """
+    def __init__(self, maxsize=64, maxbytes=256 * 2 ** 20):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._results = OrderedDict()
+        self._sizes = {}
+
+    def get(self, key, compute):
+        """Return the result stored for key, computing it with compute() on a miss"""
+        if key in self._results:
+            self.hits += 1
+            self._results.move_to_end(key)
+            return self._results[key]
+
+        self.misses += 1
+        result = compute()
+        size = _result_nbytes(result)
+        if size > self.maxbytes:
+            return result
+
+        self._results[key] = result
+        self._sizes[key] = size
+        self.nbytes += size
+        while len(self._results) > self.maxsize or self.nbytes > self.maxbytes:
+            # evict the least recently used result
+            evicted, _ = self._results.popitem(last=False)
+            self.nbytes -= self._sizes.pop(evicted)
+        return result
+
+    def __contains__(self, key) -> bool:
+        return key in self._results
+
+    def clear(self):
+        self._results.clear()
+        self._sizes.clear()
+        self.nbytes = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._results),
+                         self.nbytes, self.maxbytes)
+
+
 class UtilityManager:
     """A factory class, who purpose is to group the utility function in a simple namespace
     for easier access"""
@@ -224,13 +1395,41 @@ class UtilityManager:
     def change_axis(axis_label, values, axe) -> QValueAxis or QBarCategoryAxis or QDateTimeAxis:
         return _change_axis(axis_label, values, axe)
 
+    @staticmethod
+    def build_point_buffer(xaxis, yaxis) -> List[QPointF]:
+        return _build_point_buffer(xaxis, yaxis)
+
+    @staticmethod
+    def aggregate_by_bucket(buckets, values, aggregation) -> pd.Series:
+        return _aggregate_by_bucket(buckets, values, aggregation)
+
+    @staticmethod
+    def sort_points(xaxis, yaxis) -> (np.ndarray, np.ndarray):
+        return _sort_points(xaxis, yaxis)
+
+    @staticmethod
+    def downsample_min_max(xaxis, yaxis, width) -> (np.ndarray, np.ndarray):
+        return _downsample_min_max(xaxis, yaxis, width)
+
     @staticmethod
     def change_cursor(status) -> QCursor:
         return _change_cursor(status)
 
     @staticmethod
-    def load_dataset_from_memory() -> pd.DataFrame:
-        return _load_dataset_from_memory()
+    def load_dataset_from_memory(memory_map=False) -> pd.DataFrame:
+        return _load_dataset_from_memory(memory_map=memory_map)
+
+    @staticmethod
+    def build_calendar_features(index) -> pd.DataFrame:
+        return _build_calendar_features(index)
+
+    @staticmethod
+    def date_slice(index, first, last) -> slice:
+        return _date_slice(index, first, last)
+
+    @staticmethod
+    def count_crosstab(values, groups) -> pd.DataFrame:
+        return _count_crosstab(values, groups)
 
     @staticmethod
     def display_bar_chart_warning(parent) -> bool: